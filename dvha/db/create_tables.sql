@@ -60,3 +60,11 @@ ALTER TABLE Plans ADD COLUMN IF NOT EXISTS ptv_surface_area real;
 ALTER TABLE Plans ADD COLUMN IF NOT EXISTS ptv_volume real;
 ALTER TABLE Plans ADD COLUMN IF NOT EXISTS ptv_max_dose real;
 ALTER TABLE Plans ADD COLUMN IF NOT EXISTS ptv_min_dose real;
+-- The following indexes have been added as of DVH Analytics 0.6.1
+CREATE INDEX IF NOT EXISTS plans_uid_idx ON Plans (study_instance_uid);
+CREATE INDEX IF NOT EXISTS rxs_uid_idx ON Rxs (study_instance_uid);
+CREATE INDEX IF NOT EXISTS beams_uid_idx ON Beams (study_instance_uid);
+CREATE INDEX IF NOT EXISTS dvhs_uid_roi_idx ON DVHs (study_instance_uid, physician_roi);
+CREATE INDEX IF NOT EXISTS dvhs_institutional_roi_idx ON DVHs (institutional_roi, study_instance_uid);
+CREATE INDEX IF NOT EXISTS plans_physician_date_idx ON Plans (physician, sim_study_date);
+CREATE INDEX IF NOT EXISTS plans_tx_site_idx ON Plans (tx_site, study_instance_uid);
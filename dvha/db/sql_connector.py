@@ -12,11 +12,58 @@ Tools used to communicate with the SQL database
 
 import psycopg2
 from psycopg2 import OperationalError
+from psycopg2.pool import ThreadedConnectionPool, PoolError
 from datetime import datetime
+from itertools import count
+from threading import Lock
+from time import monotonic
 from dvha.paths import SQL_CNF_PATH, CREATE_SQL_TABLES, parse_settings_file
 from dvha.tools.errors import SQLError
 
 
+# Condition with a fixed statement shape, bind a list of study instance uids as its only parameter
+UID_CONDITION = 'study_instance_uid = ANY(%s)'
+
+# Number of rows fetched per round-trip by server-side cursors in DVH_SQL.query_iter
+QUERY_ITERSIZE = 2000
+SERVER_CURSOR_IDS = count()
+
+# Connections made with the stored credentials are reused from this pool, recreated if the credentials change
+# psycopg2 only keeps up to POOL_MIN_CONNECTIONS idle connections, any others are closed when returned
+# A query uses three at once (a snapshot connection plus the concurrent Plans and Beams queries)
+POOL_MIN_CONNECTIONS = 3
+POOL_MAX_CONNECTIONS = 8
+CONNECTION_POOL = {'config': None, 'pool': None}
+CONNECTION_POOL_LOCK = Lock()
+
+
+def get_connection_pool(config):
+    """
+    Get the shared connection pool for the provided credentials
+    :param config: database login credentials
+    :type config: dict
+    :return: a thread-safe connection pool
+    :rtype: ThreadedConnectionPool
+    """
+    with CONNECTION_POOL_LOCK:
+        if CONNECTION_POOL['pool'] is None or CONNECTION_POOL['config'] != config:
+            if CONNECTION_POOL['pool'] is not None:
+                CONNECTION_POOL['pool'].closeall()
+            CONNECTION_POOL['pool'] = ThreadedConnectionPool(POOL_MIN_CONNECTIONS, POOL_MAX_CONNECTIONS, **config)
+            CONNECTION_POOL['config'] = config
+        return CONNECTION_POOL['pool']
+
+
+def close_connection_pool():
+    """
+    Close all pooled connections, e.g., when the application exits
+    """
+    with CONNECTION_POOL_LOCK:
+        if CONNECTION_POOL['pool'] is not None:
+            CONNECTION_POOL['pool'].closeall()
+        CONNECTION_POOL['config'], CONNECTION_POOL['pool'] = None, None
+
+
 class DVH_SQL:
     """
     This class is used to communicate to the SQL database to limit the need for syntax in other files
@@ -25,16 +72,22 @@ class DVH_SQL:
         """
         :param config: optional SQL login credentials, stored values used if nothing provided
         """
+        self.pool = None
         if config:
             config = config[0]
+            cnx = psycopg2.connect(**config)
         else:
             # Read SQL configuration file
             config = parse_settings_file(SQL_CNF_PATH)
+            try:
+                self.pool = get_connection_pool(config)
+                cnx = self.pool.getconn()
+            except PoolError:  # all pooled connections are in use
+                self.pool = None
+                cnx = psycopg2.connect(**config)
 
         self.dbname = config['dbname']
 
-        cnx = psycopg2.connect(**config)
-
         self.cnx = cnx
         self.cursor = cnx.cursor()
         self.tables = ['DVHs', 'Plans', 'Rxs', 'Beams', 'DICOM_Files']
@@ -47,9 +100,38 @@ class DVH_SQL:
 
     def close(self):
         """
-        Close the SQL DB connection
+        Close the SQL DB connection, or return it to the connection pool with any uncommitted changes rolled back
         """
-        self.cnx.close()
+        if self.pool is None or self.pool.closed:
+            self.cnx.close()
+            return
+
+        if not self.cnx.closed:
+            try:
+                self.cnx.rollback()
+            except psycopg2.Error:
+                pass
+        self.pool.putconn(self.cnx, close=bool(self.cnx.closed))
+
+    def begin_read_only_snapshot(self, snapshot_id=None):
+        """
+        Start a read only, repeatable read transaction so that all following queries see the same data
+        :param snapshot_id: optional output of export_snapshot from another connection to share its snapshot
+        :type snapshot_id: str
+        """
+        self.cnx.rollback()  # SET TRANSACTION must be the first statement of a transaction
+        self.cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY;")
+        if snapshot_id:
+            self.cursor.execute("SET TRANSACTION SNAPSHOT %s;", (snapshot_id,))
+
+    def export_snapshot(self):
+        """
+        Export the snapshot of the current transaction, valid until this transaction ends
+        :return: snapshot id to be passed to begin_read_only_snapshot of other connections
+        :rtype: str
+        """
+        self.cursor.execute("SELECT pg_export_snapshot();")
+        return self.cursor.fetchone()[0]
 
     def execute_file(self, sql_file_name):
         """
@@ -97,15 +179,17 @@ class DVH_SQL:
         :type return_col_str: str
         :param condition_str: a condition in SQL syntax
         :type condition_str: str
-        :param kwargs: optional parameters order, order_by, and bokeh_cds
+        :param kwargs: optional parameters order, order_by, bokeh_cds, and params
         :return: results of the query
 
         kwargs:
             order: specify order direction (ASC or DESC)
             order_by: the column order is applied to
             bokeh_cds: structure data into a format readily accepted by bokeh's ColumnDataSource.data
+            params: values bound to %s placeholders in condition_str by psycopg2
         """
         order, order_by = None, None
+        params = kwargs.get('params')
         if kwargs:
             if 'order' in kwargs:
                 order = kwargs['order']
@@ -121,7 +205,7 @@ class DVH_SQL:
             query = "%s Order By %s %s;" % (query[:-1], order_by, order)
 
         try:
-            self.cursor.execute(query)
+            self.cursor.execute(query, params)
             results = self.cursor.fetchall()
         except Exception as e:
             raise SQLError(str(e), query)
@@ -135,14 +219,47 @@ class DVH_SQL:
 
         return results
 
-    def query_generic(self, query_str):
+    def query_iter(self, table_name, return_col_str, condition_str=None, params=None, itersize=QUERY_ITERSIZE):
+        """
+        Query with a server-side cursor so that rows are fetched in blocks as they are iterated over, rather than
+        materializing the entire result at once
+        :param table_name: 'DVHs', 'Plans', 'Rxs', 'Beams', or 'DICOM_Files'
+        :type table_name: str
+        :param return_col_str: a csv of SQL columns to be returned
+        :type return_col_str: str
+        :param condition_str: optional condition in SQL syntax, may contain %s placeholders
+        :type condition_str: str
+        :param params: values bound to %s placeholders in condition_str by psycopg2
+        :type params: list
+        :param itersize: number of rows fetched per round-trip
+        :type itersize: int
+        :return: a generator of row tuples
+        """
+        query = "Select %s from %s" % (return_col_str, table_name)
+        if condition_str:
+            query = "%s where %s" % (query, condition_str)
+
+        cursor = self.cnx.cursor(name='dvha_query_%s' % next(SERVER_CURSOR_IDS))
+        cursor.itersize = itersize
+        try:
+            cursor.execute(query, params)
+            for row in cursor:
+                yield row
+        except psycopg2.Error as e:
+            raise SQLError(str(e), query)
+        finally:
+            cursor.close()
+
+    def query_generic(self, query_str, params=None):
         """
         A generic query function that executes the provided string
         :param query_str: SQL command
         :type query_str: str
+        :param params: values bound to %s placeholders in query_str
+        :type params: list
         :return: query results
         """
-        self.cursor.execute(query_str)
+        self.cursor.execute(query_str, params)
         return self.cursor.fetchall()
 
     @property
@@ -391,7 +508,7 @@ class DVH_SQL:
         :type column: str
         :param condition: optional condition in SQL syntax
         :type condition: str
-        :param kwargs: option to ignore null values in return
+        :param kwargs: option to ignore null values in return, params bound to %s placeholders in condition
         :return: unique values from database, sorted alphabetically
         :rtype: list
         """
@@ -399,7 +516,7 @@ class DVH_SQL:
             query = "select distinct %s from %s where %s;" % (column, table, str(condition[0]))
         else:
             query = "select distinct %s from %s;" % (column, table)
-        self.cursor.execute(query)
+        self.cursor.execute(query, kwargs.get('params'))
         cursor_return = self.cursor.fetchall()
         if 'ignore_null' in kwargs and kwargs['ignore_null']:
             unique_values = [str(uv[0]) for uv in cursor_return if str(uv[0])]
@@ -561,11 +678,36 @@ def echo_sql_db(config=None):
     :rtype: bool
     """
     try:
-        if config:
-            cnx = DVH_SQL(config)
-        else:
-            cnx = DVH_SQL()
+        # always pass credentials so that a new connection is made, rather than reusing a pooled connection
+        cnx = DVH_SQL(config or parse_settings_file(SQL_CNF_PATH))
         cnx.close()
         return True
     except OperationalError:
         return False
+
+
+# Results of echo_sql_db_cached are reused for this many seconds
+ECHO_CACHE_TIMEOUT = 2.
+ECHO_CACHE = {'time': None, 'result': None}
+
+
+def echo_sql_db_cached(timeout=ECHO_CACHE_TIMEOUT):
+    """
+    Echo the database using stored credentials, reusing the last result if it is less than timeout seconds old
+    :param timeout: maximum age of a cached result in seconds
+    :type timeout: float
+    :return: True if connection could be established
+    :rtype: bool
+    """
+    now = monotonic()
+    if ECHO_CACHE['time'] is None or now - ECHO_CACHE['time'] >= timeout:
+        ECHO_CACHE['result'] = echo_sql_db()
+        ECHO_CACHE['time'] = now
+    return ECHO_CACHE['result']
+
+
+def clear_echo_sql_db_cache():
+    """
+    Force the next echo_sql_db_cached call to echo the database, e.g., after the connection settings change
+    """
+    ECHO_CACHE['time'] = None
@@ -21,14 +21,18 @@ class QuerySQL:
     you can access any column name 'some_column' with QuerySQL.some_column which will return a list of values
     for 'some_column'.  All properties contain lists with the order of their values synced, unless unique=True
     """
-    def __init__(self, table_name, condition_str, unique=False, columns=None):
+    def __init__(self, table_name, condition_str, unique=False, columns=None, params=None, snapshot_id=None):
         """
         :param table_name: 'Beams', 'DVHs', 'Plans', or 'Rxs'
         :type table_name: str
-        :param condition_str: condition in SQL syntax
+        :param condition_str: condition in SQL syntax, may contain %s placeholders
         :type condition_str: str
         :param unique: If set to True, only unique values stored
         :type unique: bool
+        :param params: values bound to the %s placeholders in condition_str
+        :type params: list
+        :param snapshot_id: optional snapshot exported by DVH_SQL.export_snapshot, to be queried read only
+        :type snapshot_id: str
         """
 
         table_name = table_name.lower()
@@ -37,6 +41,8 @@ class QuerySQL:
             self.table_name = table_name
             self.condition_str = condition_str
             with DVH_SQL() as cnx:
+                if snapshot_id:
+                    cnx.begin_read_only_snapshot(snapshot_id)
 
                 all_columns = cnx.get_column_names(table_name)
                 if columns is not None:
@@ -44,32 +50,22 @@ class QuerySQL:
                 else:
                     columns = all_columns
 
-                for column in columns:
-                    if column not in {'roi_coord_string', 'distances_to_ptv'}:  # ignored for memory since not used here
-                        self.cursor = cnx.query(self.table_name,
-                                                column,
-                                                self.condition_str)
-                        rtn_list = self.cursor_to_list()
-                        if unique:
-                            rtn_list = get_unique_list(rtn_list)
-                        setattr(self, column, rtn_list)  # create property of QuerySQL based on SQL column name
+                # ignored for memory since not used here
+                columns = [c for c in columns if c not in {'roi_coord_string', 'distances_to_ptv'}]
+
+                # all columns are queried in one statement, rows are streamed from the server in blocks
+                rtn_lists = {column: [] for column in columns}
+                for row in cnx.query_iter(self.table_name, ','.join(columns), self.condition_str, params=params):
+                    for column, value in zip(columns, row):
+                        rtn_lists[column].append(value if isinstance(value, (int, float)) else str(value))
+
+                for column, rtn_list in rtn_lists.items():
+                    if unique:
+                        rtn_list = get_unique_list(rtn_list)
+                    setattr(self, column, rtn_list)  # create property of QuerySQL based on SQL column name
         else:
             print('Table name in valid. Please select from Beams, DVHs, Plans, or Rxs.')
 
-    def cursor_to_list(self):
-        """
-        Convert a cursor return into a list of values
-        :return: queried data
-        :rtype: list
-        """
-        rtn_list = []
-        for row in self.cursor:
-            if isinstance(row[0], (int, float)):
-                rtn_list.append(row[0])
-            else:
-                rtn_list.append(str(row[0]))
-        return rtn_list
-
 
 def get_unique_list(input_list):
     """
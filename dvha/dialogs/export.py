@@ -12,18 +12,23 @@ GUI tools to export text data to a file
 
 import wx
 import wx.adv
+from os import remove, replace
+from os.path import isfile
 from dvha.models.data_table import DataTable
 from dvha.paths import DATA_DIR
 from dvha.tools.utilities import get_selected_listctrl_items, save_object_to_file
 
 
+WRITE_BUFFER_SIZE = 1 << 20
+
+
 def save_data_to_file(frame, title, data, wildcard="CSV files (*.csv)|*.csv", data_type='string', initial_dir=DATA_DIR):
     """
     from https://wxpython.org/Phoenix/docs/html/wx.FileDialog.html
     :param frame: GUI parent
     :param title: title for the file dialog window
     :type title: str
-    :param data: text data or pickle-able object to be written
+    :param data: text data, an iterable of text chunks to be streamed, or pickle-able object to be written
     :param wildcard: restrict visible files and intended file extension
     :type wildcard: str
     :param data_type: either 'string' or 'pickle'
@@ -39,11 +44,18 @@ def save_data_to_file(frame, title, data, wildcard="CSV files (*.csv)|*.csv", da
         pathname = fileDialog.GetPath()
 
         if data_type == 'string':
+            if isinstance(data, str):
+                data = [data]
+            # data may be a generator, so write to a temp file and only replace pathname once it is complete
+            temp_pathname = pathname + '.tmp'
             try:
-                with open(pathname, 'w') as file:
-                    file.write(data)
-            except IOError:
-                wx.LogError("Cannot save current data in file '%s'." % pathname)
+                with open(temp_pathname, 'w', buffering=WRITE_BUFFER_SIZE) as file:
+                    file.writelines(data)
+                replace(temp_pathname, pathname)
+            except Exception as e:
+                if isfile(temp_pathname):
+                    remove(temp_pathname)
+                wx.LogError("Cannot save current data in file '%s'.\n%s" % (pathname, e))
 
         if data_type == 'pickle':
             save_object_to_file(data, pathname)
@@ -207,7 +219,7 @@ class ExportCSVDialog(wx.Dialog):
     def run(self):
         res = self.ShowModal()
         if res == wx.ID_OK:
-            save_data_to_file(self, 'Export CSV Data', self.csv)
+            save_data_to_file(self, 'Export CSV Data', self.get_csv_chunks())
         self.Destroy()
 
     def is_checked(self, key):
@@ -219,16 +231,26 @@ class ExportCSVDialog(wx.Dialog):
 
     @property
     def csv(self):
-        csv_data = []
+        return '\n'.join(self.get_csv_items())
+
+    def get_csv_chunks(self):
+        """
+        Same text as csv, but generated one item at a time so the entire export is never held in memory
+        """
+        for i, item in enumerate(self.get_csv_items()):
+            if i:
+                yield '\n'
+            yield item
 
+    def get_csv_items(self):
         csv_key = ['DVHs', 'Endpoints', 'Radbio', 'Charting Variables']
         csv_obj = [None, self.app.endpoint, self.app.radbio, self.app.time_series, self.app.control_chart]
         for i, key in enumerate(csv_key):
             if self.is_checked(key):
-                csv_data.append('%s\n' % key)
+                yield '%s\n' % key
                 if key == 'DVHs':  # DVHs has a summary and plot data for export
-                    csv_data.append(self.app.plot.get_csv(include_summary=self.is_checked('DVHs Summary'),
-                                                          include_dvhs=self.is_checked('DVHs')))
+                    yield self.app.plot.get_csv(include_summary=self.is_checked('DVHs Summary'),
+                                                include_dvhs=self.is_checked('DVHs'))
                 else:
                     if key == 'Charting Variables':
                         selection_indices = get_selected_listctrl_items(self.list_ctrl['Charting Variables'])
@@ -236,7 +258,5 @@ class ExportCSVDialog(wx.Dialog):
                         selection = [y for i, y in enumerate(y_choices) if i in selection_indices]
                     else:
                         selection = None
-                    csv_data.append(csv_obj[i].get_csv(selection=selection))
-                csv_data.append('\n\n')
-
-        return '\n'.join(csv_data)
+                    yield csv_obj[i].get_csv(selection=selection)
+                yield '\n\n'
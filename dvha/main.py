@@ -11,17 +11,20 @@ The main file DVH Analytics
 #    available at https://github.com/cutright/DVH-Analytics
 
 import wx
-from copy import deepcopy
+from pubsub import pub
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from dateutil.parser import parse as parse_date
+from functools import lru_cache, partial
+from hashlib import blake2b
 from dvha.db import sql_columns
 from dvha.db.sql_to_python import QuerySQL
-from dvha.db.sql_connector import echo_sql_db
-from dvha.dialogs.main import query_dlg, UserSettings, About
-from dvha.dialogs.database import SQLSettingsDialog
-from dvha.dialogs.export import ExportCSVDialog, save_data_to_file
-from dvha.models.import_dicom import ImportDicomFrame
-from dvha.models.database_editor import DatabaseEditorFrame
-from dvha.models.data_table import DataTable
+from dvha.db.sql_connector import DVH_SQL, echo_sql_db_cached, clear_echo_sql_db_cache, close_connection_pool, \
+    UID_CONDITION
+from dvha.dialogs.main import query_dlg, UserSettings
+from dvha.dialogs.export import save_data_to_file
+from dvha.models.data_table import DataTable, VirtualListCtrl
 from dvha.models.plot import PlotStatDVH
 from dvha.models.dvh import DVH
 from dvha.models.endpoint import EndpointFrame
@@ -30,16 +33,88 @@ from dvha.models.rad_bio import RadBioFrame
 from dvha.models.time_series import TimeSeriesFrame
 from dvha.models.regression import RegressionFrame
 from dvha.models.control_chart import ControlChartFrame
-from dvha.models.roi_map import ROIMapFrame
 from dvha.options import Options
 from dvha.paths import LOGO_PATH, DATA_DIR, ICONS
 from dvha.tools.roi_name_manager import DatabaseROIs
 from dvha.tools.stats import StatsData
-from dvha.tools.utilities import get_study_instance_uids, scale_bitmap, is_windows, is_linux, get_window_size, \
-    save_object_to_file, load_object_from_file, set_msw_background_color, initialize_directories_and_settings
+from dvha.tools.utilities import get_common_study_instance_uids, scale_bitmap, is_windows, is_linux, get_window_size, \
+    save_object_to_file, load_object_from_file, set_msw_background_color, initialize_directories_and_settings, \
+    get_shallow_table_copy, get_indices_by_value, get_merged_ranges
+
+
+IS_WINDOWS = is_windows()
+SCALE_TOOLBAR_ICONS = IS_WINDOWS or is_linux()
+
+# SQL operators for each Filter Type of the query tables
+CATEGORICAL_OPERATORS = {'Include': '=', 'Exclude': '!='}
+NUMERICAL_OPERATORS = {'Include': 'BETWEEN', 'Exclude': 'NOT BETWEEN'}
+
+# Resize events within this many milliseconds of each other only trigger one redraw of the plots
+REDRAW_PLOTS_DELAY = 100
+
+
+@lru_cache(maxsize=None)
+def load_toolbar_bitmap(key, size=None):
+    """
+    Load (and optionally scale) a toolbar icon, cached so the image file is only read once per session
+    :param key: the toolbar key in ICONS
+    :type key: str
+    :param size: the width and height of the scaled bitmap, no scaling if None
+    :type size: int
+    :return: the toolbar icon
+    :rtype: wx.Bitmap
+    """
+    bitmap = wx.Bitmap(ICONS[key], wx.BITMAP_TYPE_ANY)
+    if size is not None:
+        bitmap = scale_bitmap(bitmap, size, size)
+    return bitmap
 
 
 class DVHAMainFrame(wx.Frame):
+    TOOLBAR_KEYS = ('Open', 'Close', 'Save', 'Export', 'Import', 'Database', 'ROI Map', 'Settings')
+    TOOLBAR_IDS = {key: i + 1000 for i, key in enumerate(TOOLBAR_KEYS)}
+    TOOLBAR_DESCRIPTIONS = {'Open': "Open previously queried data",
+                            'Close': "Clear queried data",
+                            'Save': "Save queried data",
+                            # 'Print': "Print a report",
+                            'Export': "Export data to CSV",
+                            'Import': "DICOM import wizard",
+                            'Settings': "User Settings",
+                            'Database': "Database Administrator Tools",
+                            'ROI Map': "Define ROI name aliases"}
+    TAB_KEYS = ('Welcome', 'DVHs', 'Endpoints', 'Rad Bio', 'Time Series', 'Regression', 'Control Chart')
+    QUERY_DATA_TABLES = (('numerical', 'data_table_numerical'), ('categorical', 'data_table_categorical'))
+
+    # (handler method name, toolbar key) and (handler method name, menu item key) used to bind events
+    TOOLBAR_BINDINGS = (('on_save', 'Save'),
+                        ('on_open', 'Open'),
+                        ('on_export', 'Export'),
+                        ('on_toolbar_database', 'Database'),
+                        ('on_toolbar_settings', 'Settings'),
+                        ('on_toolbar_roi_map', 'ROI Map'),
+                        ('on_close', 'Close'),
+                        ('on_toolbar_import', 'Import'))
+    MENU_BINDINGS = (('on_quit', 'qmi'),
+                     ('on_open', 'menu_open'),
+                     ('on_close', 'menu_close'),
+                     ('on_export', 'export_csv'),
+                     ('on_save', 'menu_save'),
+                     ('on_pref', 'menu_pref'),
+                     ('on_pref', 'menu_user_settings'),
+                     ('on_about', 'menu_about'),
+                     ('on_sql', 'menu_sql'),
+                     ('on_save_plot_dvhs', 'export_dvhs'),
+                     ('on_save_plot_time_series', 'export_time_series'),
+                     ('on_save_plot_regression', 'export_regression'),
+                     ('on_save_plot_control_chart', 'export_control_chart'),
+                     ('on_view_dvhs', 'view_dvhs'),
+                     ('on_view_plans', 'view_plans'),
+                     ('on_view_rxs', 'view_rxs'),
+                     ('on_view_beams', 'view_beams'))
+    # Toolbar and menu items that load, clear, or edit data, these are disabled while a query is running
+    QUERY_LOCKED_TOOLS = ('Open', 'Close', 'Save', 'Import', 'Database', 'ROI Map', 'Settings')
+    QUERY_LOCKED_MENU_ITEMS = ('menu_open', 'menu_close', 'menu_save', 'menu_pref', 'menu_user_settings', 'menu_sql')
+
     def __init__(self, *args, **kwds):
         kwds["style"] = kwds.get("style", 0) | wx.DEFAULT_FRAME_STYLE
         wx.Frame.__init__(self, *args, **kwds)
@@ -57,31 +132,43 @@ class DVHAMainFrame(wx.Frame):
         self.data = {key: None for key in ['Plans', 'Beams', 'Rxs']}
         self.stats_data = None
         self.save_data = {}
-
-        self.toolbar_keys = ['Open', 'Close', 'Save', 'Export', 'Import', 'Database', 'ROI Map', 'Settings']
-        self.toolbar_ids = {key: i + 1000 for i, key in enumerate(self.toolbar_keys)}
+        self.stale_save_data = {'endpoint', 'radbio'}
+        self.query_in_progress = False
+        self.add_filter_buttons_enabled = True
+        self.last_query_hash = None
+        self.redraw_plots_call = None
+        self.roi_map = None  # loaded by get_roi_map on first use
+        # DICOM imports and ROI remaps continue after their frames are closed, their data is final when they close
+        pub.subscribe(self.reset_query_hash, "close")
+        pub.subscribe(self.reset_query_hash, "roi_map_close")
 
         # sql_columns.py contains dictionaries of all queryable variables along with their
         # SQL columns and tables. Numerical categories include their units as well.
         self.categorical_columns = sql_columns.categorical
         self.numerical_columns = sql_columns.numerical
 
+        # Flattened lookups of the SQL table and column of each category, used to build queries
+        self.categorical_table = {key: value['table'] for key, value in self.categorical_columns.items()}
+        self.categorical_col = {key: value['var_name'] for key, value in self.categorical_columns.items()}
+        self.numerical_table = {key: value['table'] for key, value in self.numerical_columns.items()}
+        self.numerical_col = {key: value['var_name'] for key, value in self.numerical_columns.items()}
+
         # Keep track of currently selected row in the query tables
         self.selected_index_categorical = None
         self.selected_index_numerical = None
 
-        # Load ROI Map now and pass to other objects for continuity
-        # TODO: Need a method to address multiple users editing roi_map at the same time
-        self.roi_map = DatabaseROIs()
-
         self.__add_menubar()
         self.__add_tool_bar()
-        self.__add_layout_objects()
-        self.__bind_layout_objects()
-        self.__set_properties()
-        self.__set_tooltips()
-        self.__add_notebook_frames()
-        self.__do_layout()
+        self.Freeze()  # Batch the repaints from building the layout into one
+        try:
+            self.__add_layout_objects()
+            self.__bind_layout_objects()
+            self.__set_properties()
+            self.__set_tooltips()
+            self.__add_notebook_frames()
+            self.__do_layout()
+        finally:
+            self.Thaw()
 
         self.disable_query_buttons('categorical')
         self.disable_query_buttons('numerical')
@@ -93,41 +180,23 @@ class DVHAMainFrame(wx.Frame):
         self.data_table_categorical = DataTable(self.table_categorical, columns=columns['categorical'])
         self.data_table_numerical = DataTable(self.table_numerical, columns=columns['numerical'])
 
-        if not echo_sql_db():
+        if not echo_sql_db_cached():
             self.__disable_add_filter_buttons()
 
     def __add_tool_bar(self):
         self.frame_toolbar = wx.ToolBar(self, -1, style=wx.TB_HORIZONTAL | wx.TB_TEXT)
         self.SetToolBar(self.frame_toolbar)
 
-        description = {'Open': "Open previously queried data",
-                       'Close': "Clear queried data",
-                       'Save': "Save queried data",
-                       # 'Print': "Print a report",
-                       'Export': "Export data to CSV",
-                       'Import': "DICOM import wizard",
-                       'Settings': "User Settings",
-                       'Database': "Database Administrator Tools",
-                       'ROI Map': "Define ROI name aliases"}
-
-        for key in self.toolbar_keys:
-            bitmap = wx.Bitmap(ICONS[key], wx.BITMAP_TYPE_ANY)
-            if is_windows() or is_linux():
-                bitmap = scale_bitmap(bitmap, 30, 30)
-            self.frame_toolbar.AddTool(self.toolbar_ids[key], key, bitmap,
-                                       wx.NullBitmap, wx.ITEM_NORMAL, description[key], "")
+        for key in self.TOOLBAR_KEYS:
+            bitmap = load_toolbar_bitmap(key, 30 if SCALE_TOOLBAR_ICONS else None)
+            self.frame_toolbar.AddTool(self.TOOLBAR_IDS[key], key, bitmap,
+                                       wx.NullBitmap, wx.ITEM_NORMAL, self.TOOLBAR_DESCRIPTIONS[key], "")
 
             if key in {'Close', 'Export', 'ROI Map'}:
                 self.frame_toolbar.AddSeparator()
 
-        self.Bind(wx.EVT_TOOL, self.on_save, id=self.toolbar_ids['Save'])
-        self.Bind(wx.EVT_TOOL, self.on_open, id=self.toolbar_ids['Open'])
-        self.Bind(wx.EVT_TOOL, self.on_export, id=self.toolbar_ids['Export'])
-        self.Bind(wx.EVT_TOOL, self.on_toolbar_database, id=self.toolbar_ids['Database'])
-        self.Bind(wx.EVT_TOOL, self.on_toolbar_settings, id=self.toolbar_ids['Settings'])
-        self.Bind(wx.EVT_TOOL, self.on_toolbar_roi_map, id=self.toolbar_ids['ROI Map'])
-        self.Bind(wx.EVT_TOOL, self.on_close, id=self.toolbar_ids['Close'])
-        self.Bind(wx.EVT_TOOL, self.on_toolbar_import, id=self.toolbar_ids['Import'])
+        for handler, key in self.TOOLBAR_BINDINGS:
+            self.Bind(wx.EVT_TOOL, getattr(self, handler), id=self.TOOLBAR_IDS[key])
 
     def __add_menubar(self):
 
@@ -169,24 +238,25 @@ class DVHAMainFrame(wx.Frame):
         help_menu = wx.Menu()
         menu_about = help_menu.Append(wx.ID_ANY, '&About')
 
-        self.Bind(wx.EVT_MENU, self.on_quit, qmi)
-        self.Bind(wx.EVT_MENU, self.on_open, menu_open)
-        self.Bind(wx.EVT_MENU, self.on_close, menu_close)
-        self.Bind(wx.EVT_MENU, self.on_export, export_csv)
-        self.Bind(wx.EVT_MENU, self.on_save, menu_save)
-        self.Bind(wx.EVT_MENU, self.on_pref, menu_pref)
-        self.Bind(wx.EVT_MENU, self.on_pref, menu_user_settings)
-        self.Bind(wx.EVT_MENU, self.on_about, menu_about)
-        self.Bind(wx.EVT_MENU, self.on_sql, menu_sql)
-
-        self.Bind(wx.EVT_MENU, self.on_save_plot_dvhs, export_dvhs)
-        self.Bind(wx.EVT_MENU, self.on_save_plot_time_series, export_time_series)
-        self.Bind(wx.EVT_MENU, self.on_save_plot_regression, export_regression)
-        self.Bind(wx.EVT_MENU, self.on_save_plot_control_chart, export_control_chart)
-        self.Bind(wx.EVT_MENU, self.on_view_dvhs, self.data_menu_items['DVHs'])
-        self.Bind(wx.EVT_MENU, self.on_view_plans, self.data_menu_items['Plans'])
-        self.Bind(wx.EVT_MENU, self.on_view_rxs, self.data_menu_items['Rxs'])
-        self.Bind(wx.EVT_MENU, self.on_view_beams, self.data_menu_items['Beams'])
+        self.menu_items = {'qmi': qmi,
+                           'menu_open': menu_open,
+                           'menu_close': menu_close,
+                           'export_csv': export_csv,
+                           'menu_save': menu_save,
+                           'menu_pref': menu_pref,
+                           'menu_user_settings': menu_user_settings,
+                           'menu_about': menu_about,
+                           'menu_sql': menu_sql,
+                           'export_dvhs': export_dvhs,
+                           'export_time_series': export_time_series,
+                           'export_regression': export_regression,
+                           'export_control_chart': export_control_chart,
+                           'view_dvhs': self.data_menu_items['DVHs'],
+                           'view_plans': self.data_menu_items['Plans'],
+                           'view_rxs': self.data_menu_items['Rxs'],
+                           'view_beams': self.data_menu_items['Beams']}
+        for handler, key in self.MENU_BINDINGS:
+            self.Bind(wx.EVT_MENU, getattr(self, handler), self.menu_items[key])
 
         self.frame_menubar.Append(file_menu, '&File')
         self.frame_menubar.Append(self.data_menu, '&Data')
@@ -202,14 +272,13 @@ class DVHAMainFrame(wx.Frame):
                                  'del': wx.Button(self, wx.ID_ANY, "Delete Selected"),
                                  'edit': wx.Button(self, wx.ID_ANY, "Edit Selected")}
 
-        self.table_categorical = wx.ListCtrl(self, wx.ID_ANY, style=wx.BORDER_SUNKEN | wx.LC_REPORT)
-        self.table_numerical = wx.ListCtrl(self, wx.ID_ANY, style=wx.BORDER_SUNKEN | wx.LC_REPORT)
+        self.table_categorical = VirtualListCtrl(self, wx.ID_ANY, style=wx.BORDER_SUNKEN | wx.LC_REPORT)
+        self.table_numerical = VirtualListCtrl(self, wx.ID_ANY, style=wx.BORDER_SUNKEN | wx.LC_REPORT)
 
         self.button_query_execute = wx.Button(self, wx.ID_ANY, "Query and Retrieve")
 
         self.notebook_main_view = wx.Notebook(self, wx.ID_ANY)
-        self.tab_keys = ['Welcome', 'DVHs', 'Endpoints', 'Rad Bio', 'Time Series', 'Regression', 'Control Chart']
-        self.notebook_tab = {key: wx.Panel(self.notebook_main_view, wx.ID_ANY) for key in self.tab_keys}
+        self.notebook_tab = {key: wx.Panel(self.notebook_main_view, wx.ID_ANY) for key in self.TAB_KEYS}
 
         self.text_summary = wx.StaticText(self, wx.ID_ANY, "", style=wx.ALIGN_LEFT)
 
@@ -256,7 +325,8 @@ class DVHAMainFrame(wx.Frame):
 
     def __add_notebook_frames(self):
         self.plot = PlotStatDVH(self.notebook_tab['DVHs'], self.dvh, self.options)
-        self.time_series = TimeSeriesFrame(self.notebook_tab['Time Series'], self.dvh, self.data, self.options)
+        self.time_series = TimeSeriesFrame(self.notebook_tab['Time Series'], self.dvh, self.data, self.options,
+                                           table_data_getter=self.get_table_data)
         self.regression = RegressionFrame(self.notebook_tab['Regression'], self.stats_data, self.options)
         self.control_chart = ControlChartFrame(self.notebook_tab['Control Chart'], self.dvh, self.stats_data,
                                                self.options)
@@ -265,6 +335,13 @@ class DVHAMainFrame(wx.Frame):
         self.endpoint = EndpointFrame(self.notebook_tab['Endpoints'], self.dvh, self.time_series, self.regression,
                                       self.control_chart)
 
+        # endpoint and radbio save data are deep copies of their data tables, only rebuild these when modified
+        save_data_tables = {'endpoint': [self.endpoint.data_table, self.endpoint.endpoint_defs],
+                            'radbio': [self.radbio.data_table_rad_bio]}
+        for key, data_tables in save_data_tables.items():
+            for data_table in data_tables:
+                data_table.on_change = partial(self.stale_save_data.add, key)
+
     def __do_layout(self):
         sizer_summary = wx.StaticBoxSizer(wx.StaticBox(self, wx.ID_ANY, "Summary"), wx.HORIZONTAL)
         sizer_query_numerical = wx.StaticBoxSizer(wx.StaticBox(self, wx.ID_ANY, "Query by Numerical Data"),
@@ -340,7 +417,7 @@ class DVHAMainFrame(wx.Frame):
         sizer_control_chart.Add(self.control_chart.layout, 1, wx.EXPAND | wx.ALL, 25)
         self.notebook_tab['Control Chart'].SetSizer(sizer_control_chart)
 
-        for key in self.tab_keys:
+        for key in self.TAB_KEYS:
             self.notebook_main_view.AddPage(self.notebook_tab[key], key)
 
         sizer_main = wx.BoxSizer(wx.VERTICAL)
@@ -359,17 +436,25 @@ class DVHAMainFrame(wx.Frame):
         self.Center()
 
     def __enable_notebook_tabs(self):
-        for key in self.tab_keys:
-            if key in {'Regression', 'Control Chart'}:
-                self.notebook_tab[key].Enable(self.dvh.count > 1)
-            else:
-                self.notebook_tab[key].Enable()
-        self.__enable_initial_buttons_in_tabs()
+        self.notebook_main_view.Freeze()
+        try:
+            for key in self.TAB_KEYS:
+                if key in {'Regression', 'Control Chart'}:
+                    self.notebook_tab[key].Enable(self.dvh.count > 1)
+                else:
+                    self.notebook_tab[key].Enable()
+            self.__enable_initial_buttons_in_tabs()
+        finally:
+            self.notebook_main_view.Thaw()
 
     def __disable_notebook_tabs(self):
-        for key in self.tab_keys:
-            if key != 'Welcome':
-                self.notebook_tab[key].Disable()
+        self.notebook_main_view.Freeze()
+        try:
+            for key in self.TAB_KEYS:
+                if key != 'Welcome':
+                    self.notebook_tab[key].Disable()
+        finally:
+            self.notebook_main_view.Thaw()
 
     def __enable_initial_buttons_in_tabs(self):
         self.endpoint.enable_initial_buttons()
@@ -385,22 +470,20 @@ class DVHAMainFrame(wx.Frame):
         self.button_numerical['add'].Enable()
 
     def enable_query_buttons(self, query_type):
-        for key in ['del', 'edit']:
-            {'categorical': self.button_categorical[key],
-             'numerical': self.button_numerical[key]}[query_type].Enable()
+        self.set_query_buttons_state(query_type, True)
 
     def disable_query_buttons(self, query_type):
-        for key in ['del', 'edit']:
-            {'categorical': self.button_categorical[key],
-             'numerical': self.button_numerical[key]}[query_type].Disable()
+        self.set_query_buttons_state(query_type, False)
+
+    def set_query_buttons_state(self, query_type, enable):
+        buttons = self.button_categorical if query_type == 'categorical' else self.button_numerical
+        buttons['del'].Enable(enable)
+        buttons['edit'].Enable(enable)
 
     def update_all_query_buttons(self):
-        tables = {'numerical': self.data_table_numerical, 'categorical': self.data_table_categorical}
-        for key, table in tables.items():
-            if table.data is not None:
-                [self.disable_query_buttons, self.enable_query_buttons][table.row_count > 0](key)
-            else:
-                self.disable_query_buttons(key)
+        for query_type, data_table_attr in self.QUERY_DATA_TABLES:
+            table = getattr(self, data_table_attr)
+            self.set_query_buttons_state(query_type, table.data is not None and table.row_count > 0)
 
         if self.data_table_numerical.row_count + self.data_table_categorical.row_count > 0:
             self.button_query_execute.Enable()
@@ -439,9 +522,11 @@ class DVHAMainFrame(wx.Frame):
         self.save_data['version'] = self.options.VERSION
         # data_table_categorical and data_table_numerical saved after query to ensure these data reflect
         # the rest of the saved data
-        self.save_data['endpoint'] = self.endpoint.get_save_data()
+        # endpoint and radbio are only re-marshaled if their data tables changed since the last save
+        for key in self.stale_save_data:
+            self.save_data[key] = getattr(self, key).get_save_data()
+        self.stale_save_data.clear()
         self.save_data['time_series'] = self.time_series.get_save_data()
-        self.save_data['radbio'] = self.radbio.get_save_data()
         self.save_data['regression'] = self.regression.get_save_data()
 
     def load_data_obj(self, abs_file_path):
@@ -450,14 +535,24 @@ class DVHAMainFrame(wx.Frame):
         self.data = self.save_data['main_data']
 
         # .load_save_data loses column widths?
-        self.data_table_categorical.data = deepcopy(self.save_data['main_categorical']['data'])
-        self.data_table_numerical.data = deepcopy(self.save_data['main_numerical']['data'])
+        self.data_table_categorical.data = get_shallow_table_copy(self.save_data['main_categorical']['data'])
+        self.data_table_numerical.data = get_shallow_table_copy(self.save_data['main_numerical']['data'])
         self.data_table_categorical.set_data_in_layout()
         self.data_table_numerical.set_data_in_layout()
         self.update_all_query_buttons()
 
         self.exec_query(load_saved_dvh_data=True)
 
+        # Sub-frames write to wx widgets and depend on each other through dvh.endpoints, so restore them in
+        # order on the main thread, but inside one frozen region so the notebook repaints once
+        with wx.BusyCursor():
+            self.notebook_main_view.Freeze()
+            try:
+                self.load_sub_frame_save_data()
+            finally:
+                self.notebook_main_view.Thaw()
+
+    def load_sub_frame_save_data(self):
         self.endpoint.load_save_data(self.save_data['endpoint'])
         if self.endpoint.has_data:
             self.endpoint.enable_buttons()
@@ -480,21 +575,54 @@ class DVHAMainFrame(wx.Frame):
     def on_toolbar_settings(self, evt):
         self.on_pref()
 
+    def get_roi_map(self):
+        # Loaded on first use and then shared with the other frames for continuity
+        # Only called from the main thread by the toolbar handlers, exec_query_worker does not use the ROI map
+        # TODO: Need a method to address multiple users editing roi_map at the same time
+        if self.roi_map is None:
+            self.roi_map = DatabaseROIs()
+        return self.roi_map
+
     def on_toolbar_import(self, evt):
-        self.check_db_then_call(ImportDicomFrame, self.roi_map, self.options)
+        # Frames not needed at start up are imported on first use to reduce launch time
+        from dvha.models.import_dicom import ImportDicomFrame
+        self.open_data_editor(ImportDicomFrame, self.get_roi_map(), self.options)
 
     def on_toolbar_database(self, evt):
-        self.check_db_then_call(DatabaseEditorFrame, self.roi_map)
+        from dvha.models.database_editor import DatabaseEditorFrame
+        self.open_data_editor(DatabaseEditorFrame, self.get_roi_map())
 
     def on_toolbar_roi_map(self, evt):
-        self.check_db_then_call(ROIMapFrame, self.roi_map)
+        from dvha.models.roi_map import ROIMapFrame
+        self.open_data_editor(ROIMapFrame, self.get_roi_map())
+
+    def open_data_editor(self, frame_class, *parameters):
+        """
+        Open a frame that may edit the database or ROI map. The stored query hash is reset when the frame is opened
+        and again when it is closed, so the next query is not skipped as unchanged
+        :param frame_class: ImportDicomFrame, DatabaseEditorFrame, or ROIMapFrame
+        """
+        self.reset_query_hash()
+        frame = self.check_db_then_call(frame_class, *parameters)
+        if frame is not None:
+            frame.Bind(wx.EVT_WINDOW_DESTROY, self.on_data_editor_destroy)
+
+    def on_data_editor_destroy(self, evt):
+        self.reset_query_hash()
+        evt.Skip()
+
+    def reset_query_hash(self):
+        """
+        Force the next query to be executed, used when the database or ROI map may have been edited
+        """
+        self.last_query_hash = None
 
     def check_db_then_call(self, func, *parameters):
-        if not echo_sql_db():
+        if not echo_sql_db_cached():
             self.on_sql()
 
-        if echo_sql_db():
-            func(*parameters)
+        if echo_sql_db_cached():
+            return func(*parameters)
         else:
             wx.MessageBox('Connection to SQL database could not be established.', 'Connection Error',
                           wx.OK | wx.OK_DEFAULT | wx.ICON_WARNING)
@@ -544,108 +672,264 @@ class DVHAMainFrame(wx.Frame):
         self.update_all_query_buttons()
 
     def exec_query_button(self, evt):
-        # TODO: Thread this process
-        self.exec_query()
+        if self.query_in_progress:
+            return
+        self.query_in_progress = True
+        self.button_query_execute.Disable()
+        self.set_query_filters_state(False)
+        self.set_query_locked_items_state(False)
+        wx.BeginBusyCursor()
+        threading.Thread(target=self.exec_query_worker, daemon=True).start()
+
+    def exec_query_worker(self):
+        """
+        Run the SQL query and DVH parsing off of the main thread, results are passed back with wx.CallAfter
+        """
+        try:
+            query_hash, dvh = self.query_dvh()
+            # the Plans and Beams tables are also queried here, so that update_data does not block the main thread
+            data = self.query_table_data(dvh) if dvh is not None and dvh.count else None
+            result = (query_hash, dvh, data)
+        except Exception as e:
+            result = e
+        if wx.GetApp() is not None:  # the application may have exited while the query was running
+            wx.CallAfter(self.exec_query_finish, result)
+
+    def exec_query_finish(self, result):
+        """
+        Apply the results of exec_query_worker, must be called from the main thread
+        :param result: the query hash, DVH object, and table data, or the exception raised by the worker
+        """
+        if not self:  # the frame was destroyed while the query was running
+            return
+        wx.EndBusyCursor()
+        self.query_in_progress = False
+        self.set_query_filters_state(True)
+        self.set_query_locked_items_state(True)
+        if isinstance(result, Exception):
+            wx.MessageBox('The query could not be completed.\n%s' % result, 'Query Error',
+                          wx.OK | wx.OK_DEFAULT | wx.ICON_WARNING)
+            return
+        self.apply_query(*result)
+
+    def set_query_locked_items_state(self, enable):
+        """
+        Enable or disable the toolbar and menu items that would change the data while exec_query_worker is running
+        :type enable: bool
+        """
+        for key in self.QUERY_LOCKED_TOOLS:
+            self.frame_toolbar.EnableTool(self.TOOLBAR_IDS[key], enable)
+        for key in self.QUERY_LOCKED_MENU_ITEMS:
+            self.menu_items[key].Enable(enable)
+
+    def set_query_filters_state(self, enable):
+        """
+        Enable or disable the query filter tables and their buttons, which are read by exec_query_worker
+        :param enable: False while a query is running, True restores the states from before the query
+        :type enable: bool
+        """
+        if enable:
+            self.set_add_filter_buttons_state(self.add_filter_buttons_enabled)
+            self.update_all_query_buttons()
+        else:
+            self.add_filter_buttons_enabled = self.button_categorical['add'].IsEnabled()
+            self.__disable_add_filter_buttons()
+            for query_type, data_table_attr in self.QUERY_DATA_TABLES:
+                self.set_query_buttons_state(query_type, False)
+        self.table_categorical.Enable(enable)
+        self.table_numerical.Enable(enable)
 
     def exec_query(self, load_saved_dvh_data=False):
-        wait = wx.BusyCursor()
-
-        # self.dvh = None
-        self.plot.clear_plot()
-        self.endpoint.clear_data()
-        self.time_series.clear_data()
-        self.time_series.initialize_y_axis_options()
-        self.regression.clear()
-        self.control_chart.clear_data()
-        self.control_chart.initialize_y_axis_options()
-        self.radbio.clear_data()
+        if load_saved_dvh_data:
+            self.last_query_hash = None
+            self.update_query_results(load_saved_dvh_data=True)
+        else:
+            self.apply_query(*self.query_dvh())
+
+    def query_dvh(self):
+        """
+        Query the DVHs meeting the filters of the query tables, unless the result would match the current data
+        :return: hash of the query, and the queried DVH object (None if the query matches the current data)
+        :rtype: tuple
+        """
+        uids, dvh_str, dvh_params = self.get_query()
+        query_hash = self.get_query_hash(uids, dvh_str, dvh_params)
+        if self.dvh is not None and query_hash == self.last_query_hash:
+            return query_hash, None
+        return query_hash, DVH(dvh_condition=dvh_str, uid=uids, params=dvh_params)
+
+    @staticmethod
+    def get_query_hash(uids, dvh_str, dvh_params):
+        """
+        :return: a hash identifying the DVHs returned by a query
+        :rtype: str
+        """
+        query_repr = repr((sorted(uids), dvh_str, [str(param) for param in dvh_params]))
+        return blake2b(query_repr.encode('utf-8'), digest_size=16).hexdigest()
+
+    def apply_query(self, query_hash, dvh, data=None):
+        """
+        Update all tabs with the output of query_dvh, data from the previous query is only cleared if DVHs were found
+        :param data: optional output of query_table_data for dvh, queried in update_data if not provided
+        """
+        if dvh is None:  # the current data already reflects this query, only the query tables may have changed
+            self.save_query_tables()
+            return
+
+        if dvh.count:
+            self.dvh = dvh
+            self.last_query_hash = query_hash
+            self.update_query_results(data=data)
+        else:
+            wx.MessageBox('No DVHs returned. Please modify query or import more data.', 'Query Error',
+                          wx.OK | wx.OK_DEFAULT | wx.ICON_WARNING)
 
-        if not load_saved_dvh_data:
-            uids, dvh_str = self.get_query()
-            self.dvh = DVH(dvh_condition=dvh_str, uid=uids)
+    def update_query_results(self, load_saved_dvh_data=False, data=None):
+        with wx.BusyCursor():
+            self.plot.clear_plot()
+            self.endpoint.clear_data()
+            self.time_series.clear_data()
+            self.time_series.initialize_y_axis_options()
+            self.regression.clear()
+            self.control_chart.clear_data()
+            self.control_chart.initialize_y_axis_options()
+            self.radbio.clear_data()
 
-        if self.dvh.count:
             self.endpoint.update_dvh(self.dvh)
             self.text_summary.SetLabelText(self.dvh.get_summary())
             self.plot.update_plot(self.dvh)
-            del wait
-            self.notebook_main_view.SetSelection(1)
-            self.update_data(load_saved_dvh_data=load_saved_dvh_data)
-            self.time_series.update_data(self.dvh, self.data)
-            if self.dvh.count > 1:
-                self.control_chart.update_data(self.dvh, self.stats_data)
 
-            self.radbio.update_dvh_data(self.dvh)
+        self.notebook_main_view.SetSelection(1)
+        self.update_data(load_saved_dvh_data=load_saved_dvh_data, data=data)
+        self.time_series.update_data(self.dvh, self.data)
+        if self.dvh.count > 1:
+            self.control_chart.update_data(self.dvh, self.stats_data)
 
-            self.__enable_notebook_tabs()
+        self.radbio.update_dvh_data(self.dvh)
 
-            self.save_data['main_categorical'] = self.data_table_categorical.get_save_data()
-            self.save_data['main_numerical'] = self.data_table_numerical.get_save_data()
-        else:
-            del wait
-            wx.MessageBox('No DVHs returned. Please modify query or import more data.', 'Query Error',
-                          wx.OK | wx.OK_DEFAULT | wx.ICON_WARNING)
-            self.dvh = None
+        self.__enable_notebook_tabs()
+
+        self.save_query_tables()
+
+    def save_query_tables(self):
+        self.save_data['main_categorical'] = self.data_table_categorical.get_save_data()
+        self.save_data['main_numerical'] = self.data_table_numerical.get_save_data()
 
     def get_query(self):
 
-        # Used to accumulate lists of query strings for each table
+        # Used to accumulate lists of query strings and their bound parameters for each table
         # Will assume each item in list is complete query for that SQL column
         queries = {'Plans': [], 'Rxs': [], 'Beams': [], 'DVHs': []}
+        params = {'Plans': [], 'Rxs': [], 'Beams': [], 'DVHs': []}
 
         # Used to group queries by variable, will combine all queries of same variable with an OR operator
-        # e.g., queries_by_sql_column['Plans'][key] = list of strings, where key is sql column
+        # e.g., queries_by_sql_column['Plans'][key] = list of (operator, values) tuples, where key is sql column
         queries_by_sql_column = {'Plans': {}, 'Rxs': {}, 'Beams': {}, 'DVHs': {}}
 
+        # Rows are grouped by category so that each category's SQL table and column are only looked up once
         # Categorical filter
+        # Each column is zipped into (operator, values) filters once, rather than indexing every column per row
+        data = self.data_table_categorical.data
         if self.data_table_categorical.row_count:
-            for i, category in enumerate(self.data_table_categorical.data['category_1']):
-                table = self.categorical_columns[category]['table']
-                col = self.categorical_columns[category]['var_name']
-                value = self.data_table_categorical.data['category_2'][i]
-                if col not in queries_by_sql_column[table]:
-                    queries_by_sql_column[table][col] = []
-                operator = ['=', '!='][{'Include': 0, 'Exclude': 1}[self.data_table_categorical.data['Filter Type'][i]]]
-                queries_by_sql_column[table][col].append("%s %s '%s'" % (col, operator, value))
+            filters = [(CATEGORICAL_OPERATORS[filter_type], (value,))
+                       for filter_type, value in zip(data['Filter Type'], data['category_2'])]
+            for category, indices in get_indices_by_value(data['category_1']).items():
+                table, col = self.categorical_table[category], self.categorical_col[category]
+                queries_by_sql_column[table].setdefault(col, []).extend([filters[i] for i in indices])
 
         # Range filter
+        data = self.data_table_numerical.data
         if self.data_table_numerical.row_count:
-            for i, category in enumerate(self.data_table_numerical.data['category']):
-                table = self.numerical_columns[category]['table']
-                col = self.numerical_columns[category]['var_name']
-                value_low = self.data_table_numerical.data['min'][i]
-                value_high = self.data_table_numerical.data['max'][i]
-                if 'date' in col:
-                    value_low = "'%s'::date" % value_low
-                    value_high = "'%s'::date" % value_high
-                if col not in queries_by_sql_column[table]:
-                    queries_by_sql_column[table][col] = []
-                operator = ['BETWEEN', 'NOT BETWEEN'][
-                    {'Include': 0, 'Exclude': 1}[self.data_table_numerical.data['Filter Type'][i]]]
-                queries_by_sql_column[table][col].append("%s %s %s AND %s" % (col, operator, value_low, value_high))
+            filters = [(NUMERICAL_OPERATORS[filter_type], (min_value, max_value))
+                       for filter_type, min_value, max_value in zip(data['Filter Type'], data['min'], data['max'])]
+            for category, indices in get_indices_by_value(data['category']).items():
+                table, col = self.numerical_table[category], self.numerical_col[category]
+                queries_by_sql_column[table].setdefault(col, []).extend([filters[i] for i in indices])
 
         for table in queries:
-            for col in queries_by_sql_column[table]:
-                queries[table].append("(%s)" % ' OR '.join(queries_by_sql_column[table][col]))
+            for col, col_queries in queries_by_sql_column[table].items():
+                col_query, col_params = self.get_column_query(col, col_queries)
+                queries[table].append(col_query)
+                params[table].extend(col_params)
             queries[table] = ' AND '.join(queries[table])
 
-        uids = get_study_instance_uids(plans=queries['Plans'], rxs=queries['Rxs'], beams=queries['Beams'])['common']
-
-        return uids, queries['DVHs']
-
-    def update_data(self, load_saved_dvh_data=False):
-        wait = wx.BusyCursor()
-        tables = ['Plans', 'Rxs', 'Beams']
-        if hasattr(self.dvh, 'study_instance_uid'):
+        uids = get_common_study_instance_uids(plans=(queries['Plans'], params['Plans']),
+                                              rxs=(queries['Rxs'], params['Rxs']),
+                                              beams=(queries['Beams'], params['Beams']))
+
+        return uids, queries['DVHs'], params['DVHs']
+
+    @staticmethod
+    def get_column_query(col, col_queries):
+        """
+        Collapse the filters of a single SQL column into one condition with %s placeholders
+        Equality filters are grouped into IN / NOT IN, overlapping include ranges are merged into disjoint BETWEENs
+        :param col: SQL column
+        :type col: str
+        :param col_queries: (operator, values) for each filter applied to col
+        :type col_queries: list
+        :return: condition in SQL syntax, parenthesized if it has more than one predicate (FALSE if it has none),
+        and the values to be bound to its placeholders
+        :rtype: tuple
+        """
+        is_date = 'date' in col
+        placeholder = "%s::date" if is_date else "%s"
+
+        predicates, params = [], []
+        for operator, sql_operator in [('=', 'IN'), ('!=', 'NOT IN')]:
+            values = list(dict.fromkeys(value for op, op_values in col_queries if op == operator
+                                        for value in op_values))
+            if values:
+                predicates.append("%s %s (%s)" % (col, sql_operator, ', '.join([placeholder] * len(values))))
+                params.extend(values)
+
+        # Include ranges are OR'd together, so overlapping ranges can be merged into disjoint BETWEEN predicates
+        ranges = {'BETWEEN': get_merged_ranges([values for op, values in col_queries if op == 'BETWEEN'],
+                                               key=parse_date if is_date else float),
+                  'NOT BETWEEN': list(dict.fromkeys(values for op, values in col_queries if op == 'NOT BETWEEN'))}
+        for operator, operator_ranges in ranges.items():
+            for values in operator_ranges:
+                predicates.append("%s %s %s AND %s" % (col, operator, placeholder, placeholder))
+                params.extend(values)
+
+        # Empty include ranges (min > max) are dropped above, if nothing is left the column matches no rows
+        if not predicates:
+            return "FALSE", params
+        if len(predicates) == 1:
+            return predicates[0], params
+        return "(%s)" % ' OR '.join(predicates), params
+
+    @staticmethod
+    def query_table_data(dvh):
+        """
+        Query the Plans, Rxs, and Beams data of the DVHs, does not use the GUI so it may be called from a worker thread
+        :param dvh: queried DVH object
+        :type dvh: DVH
+        :return: QuerySQL objects by table, Rxs is None until first used (see get_table_data)
+        :rtype: dict
+        """
+        # Plans and Beams are needed by StatsData, Rxs is only queried when viewed or plotted in Time Series
+        eager_tables = ['Plans', 'Beams']
+        params = [dvh.study_instance_uid]
+        # Each QuerySQL opens its own connection, so the independent table queries can run concurrently
+        # They share one read only snapshot, held open by cnx until all have finished, for a consistent view
+        with DVH_SQL() as cnx:
+            cnx.begin_read_only_snapshot()
+            snapshot_id = cnx.export_snapshot()
+            with ThreadPoolExecutor(max_workers=len(eager_tables)) as executor:
+                futures = {key: executor.submit(QuerySQL, key, UID_CONDITION, params=params, snapshot_id=snapshot_id)
+                           for key in eager_tables}
+        return {key: futures[key].result() if key in futures else None for key in ['Plans', 'Rxs', 'Beams']}
+
+    def update_data(self, load_saved_dvh_data=False, data=None):
+        if not hasattr(self.dvh, 'study_instance_uid'):
+            self.data = {key: None for key in ['Plans', 'Rxs', 'Beams']}
+            return
+
+        with wx.BusyCursor():
             if not load_saved_dvh_data:
-                condition_str = "study_instance_uid in ('%s')" % "','".join(self.dvh.study_instance_uid)
-                self.data = {key: QuerySQL(key, condition_str) for key in tables}
-        else:
-            self.data = {key: None for key in tables}
-        del wait
+                self.data = data if data is not None else self.query_table_data(self.dvh)
 
-        if hasattr(self.dvh, 'study_instance_uid'):
-            wait = wx.BusyCursor()
             self.stats_data = StatsData(self.dvh, self.data)
             self.regression.stats_data = self.stats_data
             self.control_chart.stats_data = self.stats_data
@@ -655,7 +939,6 @@ class DVHAMainFrame(wx.Frame):
                 # TODO: Print error in GUI
                 pass
             self.control_chart.update_combo_box_y_choices()
-            del wait
 
     # --------------------------------------------------------------------------------------------------------------
     # Menu bar event functions
@@ -675,6 +958,7 @@ class DVHAMainFrame(wx.Frame):
 
     def close(self):
         self.dvh = None
+        self.last_query_hash = None
         self.data_table_categorical.delete_all_rows()
         self.data_table_numerical.delete_all_rows()
         self.plot.clear_plot()
@@ -694,20 +978,34 @@ class DVHAMainFrame(wx.Frame):
 
     def on_export(self, evt):
         if self.dvh is not None:
+            from dvha.dialogs.export import ExportCSVDialog
             ExportCSVDialog(self)
         else:
             wx.MessageBox('There is no data to export! Please query some data first.', 'Export Error',
                           wx.OK | wx.ICON_WARNING)
 
     def on_about(self, evt):
+        from dvha.dialogs.main import About
         About()
 
     def on_pref(self, *args):
         UserSettings(self.options)
 
     def on_sql(self, *args):
+        from dvha.dialogs.database import SQLSettingsDialog
         SQLSettingsDialog()
-        [self.__disable_add_filter_buttons, self.__enable_add_filter_buttons][echo_sql_db()]()
+        clear_echo_sql_db_cache()
+        # Echo the new settings in the background so the GUI is not blocked while a connection is attempted
+        threading.Thread(target=self.echo_sql_db_worker, daemon=True).start()
+
+    def echo_sql_db_worker(self):
+        wx.CallAfter(self.set_add_filter_buttons_state, echo_sql_db_cached())
+
+    def set_add_filter_buttons_state(self, enable):
+        if enable:
+            self.__enable_add_filter_buttons()
+        else:
+            self.__disable_add_filter_buttons()
 
     def on_save_plot_dvhs(self, evt):
         save_data_to_file(self, 'Save DVHs plot', self.plot.html_str,
@@ -725,6 +1023,19 @@ class DVHAMainFrame(wx.Frame):
         save_data_to_file(self, 'Save Control Chart plot', self.control_chart.plot.html_str,
                           wildcard="HTML files (*.html)|*.html")
 
+    def get_table_data(self, key):
+        """
+        Get the queried data of a Plans, Rxs, or Beams table, querying the table on first use if it was deferred
+        :param key: 'Plans', 'Rxs', or 'Beams'
+        :type key: str
+        :return: queried table data, None if there is no DVH data
+        :rtype: QuerySQL
+        """
+        if self.data[key] is None and hasattr(self.dvh, 'study_instance_uid'):
+            with wx.BusyCursor():
+                self.data[key] = QuerySQL(key, UID_CONDITION, params=[self.dvh.study_instance_uid])
+        return self.data[key]
+
     def on_view_dvhs(self, evt):
         self.view_table_data('DVHs')
 
@@ -741,7 +1052,7 @@ class DVHAMainFrame(wx.Frame):
         if key == 'DVHs':
             data = self.dvh
         else:
-            data = self.data[key]
+            data = self.get_table_data(key)
 
         if data:
             if self.get_menu_item_status(key) == 'Show':
@@ -755,8 +1066,7 @@ class DVHAMainFrame(wx.Frame):
             dlg.Destroy()
 
     def get_menu_item_status(self, key):
-        show_hide = ['Hide', 'Show']['Show' in self.data_menu.GetLabel(self.data_menu_items[key].GetId())]
-        return show_hide
+        return 'Show' if 'Show' in self.data_menu.GetLabel(self.data_menu_items[key].GetId()) else 'Hide'
 
     def redraw_plots(self):
         if self.dvh:
@@ -769,7 +1079,11 @@ class DVHAMainFrame(wx.Frame):
         try:
             self.Refresh()
             self.Layout()
-            wx.CallAfter(self.redraw_plots)
+            # Restart the pending redraw rather than queueing one per event while the window is being dragged
+            if self.redraw_plots_call is not None and self.redraw_plots_call.IsRunning():
+                self.redraw_plots_call.Restart(REDRAW_PLOTS_DELAY)
+            else:
+                self.redraw_plots_call = wx.CallLater(REDRAW_PLOTS_DELAY, self.redraw_plots)
         except RuntimeError:
             pass
 
@@ -778,7 +1092,7 @@ class MainApp(wx.App):
     def OnInit(self):
 
         initialize_directories_and_settings()
-        if is_windows():
+        if IS_WINDOWS:
             from dvha.tools.windows_reg_edit import set_ie_emulation_level
             set_ie_emulation_level()
 
@@ -788,6 +1102,10 @@ class MainApp(wx.App):
         self.frame.Show()
         return True
 
+    def OnExit(self):
+        close_connection_pool()
+        return super().OnExit()
+
 
 def start():
     app = MainApp(0)
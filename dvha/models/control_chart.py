@@ -10,6 +10,7 @@ Class for the Control Chart frame in the main view
 #    See the file LICENSE included with this distribution, also
 #    available at https://github.com/cutright/DVH-Analytics
 
+import numpy as np
 import wx
 from pubsub import pub
 from dvha.models.plot import PlotControlChart
@@ -107,7 +108,7 @@ class ControlChartFrame:
         mrn_sorted = [self.stats_data.mrns[i] for i in sort_index]
         uid_sorted = [self.stats_data.uids[i] for i in sort_index]
 
-        x = list(range(1, len(dates)+1))
+        x = np.arange(1, len(dates) + 1, dtype=np.int32)
 
         self.plot.update_plot(x, y_values_sorted, mrn_sorted, uid_sorted, dates_sorted, y_axis_label=self.y_axis)
 
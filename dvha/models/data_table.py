@@ -15,6 +15,21 @@ import wx
 from dvha.tools.utilities import get_selected_listctrl_items, get_sorted_indices
 
 
+class VirtualListCtrl(wx.ListCtrl):
+    """
+    A list_ctrl in virtual mode, the text of each cell is pulled from the linked DataTable only when drawn
+    """
+    def __init__(self, *args, **kwargs):
+        kwargs['style'] = kwargs.get('style', 0) | wx.LC_REPORT | wx.LC_VIRTUAL
+        wx.ListCtrl.__init__(self, *args, **kwargs)
+        self.data_table = None
+
+    def OnGetItemText(self, item, col):
+        if self.data_table is None:
+            return ''
+        return self.data_table.get_layout_text(item, col)
+
+
 class DataTable:
     """
     This is a helper class containing the UI elements of the list_ctrl.  Adding / Changing data with this class
@@ -35,8 +50,12 @@ class DataTable:
         """
 
         self.layout = list_ctrl
+        self.is_virtual = isinstance(list_ctrl, VirtualListCtrl)
+        if self.is_virtual:
+            list_ctrl.data_table = self
 
         self.sort_indices = None
+        self.on_change = None  # optional callback, called with no arguments whenever self.data is modified
 
         self.data = deepcopy(data)
         self.columns = deepcopy(columns)
@@ -96,6 +115,7 @@ class DataTable:
         delete_rows = bool(self.row_count)
         self.data = deepcopy(data)
         self.columns = deepcopy(columns)
+        self.notify_change()
         if delete_rows:
             self.delete_all_rows(layout_only=True)
 
@@ -106,6 +126,13 @@ class DataTable:
         if self.widths:
             self.set_column_widths()
 
+    def notify_change(self):
+        """
+        Call self.on_change, if set, so observers know self.data has been modified
+        """
+        if self.on_change is not None:
+            self.on_change()
+
     def set_layout_columns(self):
         self.layout.DeleteAllColumns()
         for i, col in enumerate(self.columns):
@@ -148,6 +175,7 @@ class DataTable:
             self.layout.AppendColumn(column, format=format)
         self.columns.append(column)
         self.data[column] = [''] * self.row_count
+        self.notify_change()
 
     def delete_column(self, column):
         """
@@ -164,16 +192,54 @@ class DataTable:
                     print(e)
             self.data.pop(column)
             self.columns.pop(index)
+            self.notify_change()
 
     def set_data_in_layout(self):
         """
         Retrieve data from self.data, convert to row_data format, add to layout
         """
+        if self.is_virtual:
+            self.refresh_virtual_layout()
+            return
+
         row_data = self.data_to_list_of_rows()
 
         for row in row_data:
             self.append_row(row, layout_only=True)
 
+    def refresh_virtual_layout(self):
+        """
+        A virtual list_ctrl only needs the row count, cell text is retrieved with get_layout_text
+        """
+        self.layout.SetItemCount(self.row_count)
+        self.layout.Refresh()
+
+    def get_layout_text(self, row_index, column_index):
+        """
+        Get the text displayed in the layout for a given cell
+        :param row_index: row index
+        :type row_index: int
+        :param column_index: column index
+        :type column_index: int
+        :return: the formatted value
+        :rtype: str
+        """
+        return self.format_layout_value(self.get_value(row_index, column_index), column_index)
+
+    @staticmethod
+    def format_layout_value(value, column_index):
+        """
+        :param value: a value from self.data
+        :param column_index: the first column is never formatted as a number
+        :type column_index: int
+        :return: value formatted for the layout
+        :rtype: str
+        """
+        if column_index:
+            if isinstance(value, float) or isinstance(value, int) and str(value) not in {'True', 'False'}:
+                return "%0.2f" % value
+        return str(value)
+
     def append_row(self, row, layout_only=False):
         """
         Add a row of data
@@ -185,13 +251,12 @@ class DataTable:
         if not layout_only:
             self.append_row_to_data(row)
         if self.layout:
+            if self.is_virtual:
+                self.refresh_virtual_layout()
+                return
             index = self.layout.InsertItem(50000, str(row[0]))
             for i in range(len(row))[1:]:
-                if isinstance(row[i], float) or isinstance(row[i], int) and str(row[i]) not in {'True', 'False'}:
-                    value = "%0.2f" % row[i]
-                else:
-                    value = str(row[i])
-                self.layout.SetItem(index, i, value)
+                self.layout.SetItem(index, i, self.format_layout_value(row[i], i))
 
     def append_row_to_data(self, row):
         """
@@ -205,6 +270,7 @@ class DataTable:
         else:
             for i, key in enumerate(self.keys):
                 self.data[key].append(row[i])
+        self.notify_change()
 
     def edit_row_to_data(self, row, index):
         """
@@ -216,6 +282,7 @@ class DataTable:
         """
         for i, key in enumerate(self.keys):
             self.data[key][index] = row[i]
+        self.notify_change()
 
     def delete_row(self, index, layout_only=False):
         """
@@ -229,8 +296,12 @@ class DataTable:
             if not layout_only:
                 for key in self.keys:
                     self.data[key].pop(index)
+                self.notify_change()
             if self.layout:
-                self.layout.DeleteItem(index)
+                if self.is_virtual:
+                    self.refresh_virtual_layout()
+                else:
+                    self.layout.DeleteItem(index)
 
     def delete_all_rows(self, layout_only=False, force_delete_data=False):
         """
@@ -247,6 +318,7 @@ class DataTable:
                 if self.data:
                     for key in self.keys:
                         self.data[key] = []
+                    self.notify_change()
 
     def edit_row(self, row, index):
         """
@@ -258,6 +330,9 @@ class DataTable:
         """
         self.edit_row_to_data(row, index)
         if self.layout:
+            if self.is_virtual:
+                self.layout.RefreshItem(index)
+                return
             for i in range(len(row)):
                 self.layout.SetItem(index, i, str(row[i]))
 
@@ -11,7 +11,7 @@ Class to retrieve DVH data from SQL, calculate parameters dependent on DVHs, and
 #    available at https://github.com/cutright/DVH-Analytics
 
 import numpy as np
-from dvha.db.sql_connector import DVH_SQL
+from dvha.db.sql_connector import DVH_SQL, UID_CONDITION
 from dvha.db.sql_to_python import QuerySQL
 from dvha.tools.utilities import convert_value_to_str
 
@@ -19,25 +19,30 @@ from dvha.tools.utilities import convert_value_to_str
 # This class retrieves DVH data from the SQL database and calculates statistical DVHs (min, max, quartiles)
 # It also provides some inspection tools of the retrieved data
 class DVH:
-    def __init__(self, uid=None, dvh_condition=None):
+    def __init__(self, uid=None, dvh_condition=None, params=None):
         """
         This class will retrieve DVHs and other data in the DVH SQL table meeting the given constraints,
         it will also parse the DVH_string into python lists and retrieve the associated Rx dose
         :param uid: a list of allowed study_instance_uids in data set
         :param dvh_condition: a string in SQL syntax applied to a DVH Table query
+        :param params: values bound to %s placeholders in dvh_condition
         """
 
         self.uid = uid
 
         if uid:
-            constraints_str = "study_instance_uid in ('%s')" % "', '".join(uid)
+            # bind uids as one array parameter so the statement text does not change with the uid list
+            constraints_str = UID_CONDITION
+            constraints_params = [list(uid)]
             if dvh_condition:
                 constraints_str = "(%s) and %s" % (dvh_condition, constraints_str)
+                constraints_params = list(params or []) + constraints_params
         else:
             constraints_str = ''
+            constraints_params = None
 
         # Get DVH data from SQL and set as attributes
-        dvh_data = QuerySQL('DVHs', constraints_str)
+        dvh_data = QuerySQL('DVHs', constraints_str, params=constraints_params)
         if dvh_data.mrn:
             ignored_keys = {'cnx', 'cursor', 'table_name', 'constraints_str', 'condition_str'}
             self.keys = []
@@ -88,8 +93,8 @@ class DVH:
 
             # Store these now so they can be saved in DVH object without needing to query later
             with DVH_SQL() as cnx:
-                self.physician_count = len(cnx.get_unique_values('Plans', 'physician',
-                                                                 "study_instance_uid in ('%s')" % "','".join(self.uid)))
+                self.physician_count = len(cnx.get_unique_values('Plans', 'physician', UID_CONDITION,
+                                                                 params=[list(self.uid)]))
             self.total_fxs = self.get_plan_values('fxs')
             self.fx_dose = self.get_rx_values('fx_dose')
             self.ptv_overlap = self.ptv_overlap
@@ -105,8 +110,8 @@ class DVH:
         :rtype: list
         """
         with DVH_SQL() as cnx:
-            condition = "study_instance_uid in ('%s')" % "','".join(self.study_instance_uid)
-            data = cnx.query('Plans', 'study_instance_uid, %s' % plan_column, condition)
+            data = cnx.query('Plans', 'study_instance_uid, %s' % plan_column, UID_CONDITION,
+                             params=[self.study_instance_uid])
 
         uids = [row[0] for row in data]
         values = [row[1] for row in data]
@@ -121,8 +126,8 @@ class DVH:
         :rtype: list
         """
         with DVH_SQL() as cnx:
-            condition = "study_instance_uid in ('%s')" % "','".join(self.study_instance_uid)
-            data = cnx.query('Rxs', 'study_instance_uid, %s' % rx_column, condition)
+            data = cnx.query('Rxs', 'study_instance_uid, %s' % rx_column, UID_CONDITION,
+                             params=[self.study_instance_uid])
 
         uids = [row[0] for row in data]
         values = [row[1] for row in data]
@@ -182,9 +187,7 @@ class DVH:
         """
         doses = np.zeros(self.count)
         for x in range(self.count):
-            dvh = np.zeros(len(self.dvh))
-            for y in range(len(self.dvh)):
-                dvh[y] = self.dvh[y][x]
+            dvh = self.dvh[:, x]
             if volume_scale == 'relative':
                 doses[x] = dose_to_volume(dvh, volume)
             else:
@@ -213,10 +216,7 @@ class DVH:
         """
         volumes = np.zeros(self.count)
         for x in range(self.count):
-
-            dvh = np.zeros(len(self.dvh))
-            for y in range(len(self.dvh)):
-                dvh[y] = self.dvh[y][x]
+            dvh = self.dvh[:, x]
             if dose_scale == 'relative':
                 if isinstance(self.rx_dose[x], str):
                     volumes[x] = 0
@@ -292,14 +292,7 @@ class DVH:
         if volume_scale == 'absolute':
             dvhs = self.dvhs_to_abs_vol(dvhs)
 
-        standard_stat_dvh = {'min': np.min(dvhs, 1),
-                             'q1': np.percentile(dvhs, 25, 1),
-                             'mean': np.mean(dvhs, 1),
-                             'median': np.median(dvhs, 1),
-                             'q3': np.percentile(dvhs, 75, 1),
-                             'max': np.max(dvhs, 1)}
-
-        return standard_stat_dvh
+        return calc_standard_stat_dvh(dvhs)
 
     def dvhs_to_abs_vol(self, dvhs):
         """
@@ -356,6 +349,24 @@ class DVH:
         return bool(len(self.mrn))
 
 
+def calc_standard_stat_dvh(dvhs):
+    """
+    :param dvhs: DVHs (dvh[bin, roi_index])
+    :type dvhs: numpy 2D array
+    :return: min, q1, mean, median, q3, and max of each bin
+    :rtype: dict
+    """
+    # The 0th and 100th percentiles are the min and max, so one sort of each bin provides all but the mean
+    dvhs = np.ascontiguousarray(dvhs, dtype=np.float64)
+    stats = np.percentile(dvhs, [0, 25, 50, 75, 100], 1)
+    return {'min': stats[0],
+            'q1': stats[1],
+            'mean': np.mean(dvhs, 1),
+            'median': stats[2],
+            'q3': stats[3],
+            'max': stats[4]}
+
+
 # Returns the isodose level outlining the given volume
 def dose_to_volume(dvh, rel_volume):
     """
@@ -416,34 +416,33 @@ class ImportDicomFrame(wx.Frame):
         if uid in list(self.parsed_dicom_data) and self.parsed_dicom_data[uid].validation['complete_file_set']:
             if uid != self.selected_uid:
                 self.selected_uid = uid
-                wait = wx.BusyCursor()
-                self.dicom_importer.rebuild_tree_ctrl_rois(uid)
-                self.tree_ctrl_roi.ExpandAll()
-                if uid not in list(self.parsed_dicom_data):
-                    file_paths = self.dicom_importer.dicom_file_paths[uid]
-                    self.parsed_dicom_data[uid] = DICOM_Parser(plan=file_paths['rtplan']['file_path'],
-                                                               structure=file_paths['rtstruct']['file_path'],
-                                                               dose=file_paths['rtdose']['file_path'],
-                                                               global_plan_over_rides=self.global_plan_over_rides,
-                                                               roi_map=self.roi_map)
-                data = self.parsed_dicom_data[uid]
-
-                self.input['mrn'].SetValue(data.mrn)
-                self.input['study_instance_uid'].SetValue(data.study_instance_uid_to_be_imported)
-                if data.birth_date is None or data.birth_date == '':
-                    self.input['birth_date'].SetValue('')
-                else:
-                    self.input['birth_date'].SetValue(datetime_to_date_string(data.birth_date))
-                if data.sim_study_date is None or data.sim_study_date == '':
-                    self.input['sim_study_date'].SetValue('')
-                else:
-                    self.input['sim_study_date'].SetValue(datetime_to_date_string(data.sim_study_date))
-                physician = ['DEFAULT', data.physician][data.physician in self.roi_map.get_physicians()]
-                self.input['physician'].SetValue(physician)
-                self.input['tx_site'].SetValue(data.tx_site)
-                self.input['rx_dose'].SetValue(str(data.rx_dose))
-                self.dicom_importer.update_mapped_roi_status(data.physician)
-                del wait
+                with wx.BusyCursor():
+                    self.dicom_importer.rebuild_tree_ctrl_rois(uid)
+                    self.tree_ctrl_roi.ExpandAll()
+                    if uid not in list(self.parsed_dicom_data):
+                        file_paths = self.dicom_importer.dicom_file_paths[uid]
+                        self.parsed_dicom_data[uid] = DICOM_Parser(plan=file_paths['rtplan']['file_path'],
+                                                                   structure=file_paths['rtstruct']['file_path'],
+                                                                   dose=file_paths['rtdose']['file_path'],
+                                                                   global_plan_over_rides=self.global_plan_over_rides,
+                                                                   roi_map=self.roi_map)
+                    data = self.parsed_dicom_data[uid]
+
+                    self.input['mrn'].SetValue(data.mrn)
+                    self.input['study_instance_uid'].SetValue(data.study_instance_uid_to_be_imported)
+                    if data.birth_date is None or data.birth_date == '':
+                        self.input['birth_date'].SetValue('')
+                    else:
+                        self.input['birth_date'].SetValue(datetime_to_date_string(data.birth_date))
+                    if data.sim_study_date is None or data.sim_study_date == '':
+                        self.input['sim_study_date'].SetValue('')
+                    else:
+                        self.input['sim_study_date'].SetValue(datetime_to_date_string(data.sim_study_date))
+                    physician = ['DEFAULT', data.physician][data.physician in self.roi_map.get_physicians()]
+                    self.input['physician'].SetValue(physician)
+                    self.input['tx_site'].SetValue(data.tx_site)
+                    self.input['rx_dose'].SetValue(str(data.rx_dose))
+                    self.dicom_importer.update_mapped_roi_status(data.physician)
                 self.update_physician_roi_choices()
                 self.enable_inputs()
         else:
@@ -616,35 +615,34 @@ class ImportDicomFrame(wx.Frame):
             self.input_roi['physician'].SetValue(physician_roi)
 
     def on_apply_plan(self, evt):
-        wait = wx.BusyCursor()
-        self.on_physician_change()
-        over_rides = self.parsed_dicom_data[self.selected_uid].plan_over_rides
-        apply_all_selected = False
-        for key in list(over_rides):
-            value = self.input[key].GetValue()
-            if 'date' in key:
-                over_rides[key] = self.validate_date(value)
-            elif key == 'rx_dose':
-                over_rides[key] = self.validate_dose(value)
+        with wx.BusyCursor():
+            self.on_physician_change()
+            over_rides = self.parsed_dicom_data[self.selected_uid].plan_over_rides
+            apply_all_selected = False
+            for key in list(over_rides):
+                value = self.input[key].GetValue()
+                if 'date' in key:
+                    over_rides[key] = self.validate_date(value)
+                elif key == 'rx_dose':
+                    over_rides[key] = self.validate_dose(value)
+                else:
+                    if not value:
+                        value = None
+                    over_rides[key] = value
+
+                # Apply all
+                if "%s_1" % key in list(self.checkbox):
+                    apply_all_selected = True
+                    if self.checkbox["%s_1" % key].IsChecked():
+                        self.global_plan_over_rides[key]['value'] = value
+                        self.global_plan_over_rides[key]['only_if_missing'] = self.checkbox["%s_2" % key].IsChecked()
+
+            self.clear_plan_check_boxes()
+            if apply_all_selected:
+                self.validate()
             else:
-                if not value:
-                    value = None
-                over_rides[key] = value
-
-            # Apply all
-            if "%s_1" % key in list(self.checkbox):
-                apply_all_selected = True
-                if self.checkbox["%s_1" % key].IsChecked():
-                    self.global_plan_over_rides[key]['value'] = value
-                    self.global_plan_over_rides[key]['only_if_missing'] = self.checkbox["%s_2" % key].IsChecked()
-
-        self.clear_plan_check_boxes()
-        if apply_all_selected:
-            self.validate()
-        else:
-            self.validate(uid=self.selected_uid)
-        self.update_warning_label()
-        del wait
+                self.validate(uid=self.selected_uid)
+            self.update_warning_label()
 
     def on_apply_roi(self, evt):
         if self.allow_input_roi_apply:
@@ -747,34 +745,32 @@ class ImportDicomFrame(wx.Frame):
         orange = wx.Colour(255, 165, 0)
         yellow = wx.Colour(255, 255, 0)
         if self.is_all_data_parsed:
-            wait = wx.BusyCursor()
-            if not uid:
-                nodes = self.dicom_importer.plan_nodes
-            else:
-                nodes = {uid: self.dicom_importer.plan_nodes[uid]}
-            for uid, node in nodes.items():
-                if uid in list(self.parsed_dicom_data):
-                    validation = self.parsed_dicom_data[uid].validation
-                    failed_keys = {key for key, value in validation.items() if not value['status']}
+            with wx.BusyCursor():
+                if not uid:
+                    nodes = self.dicom_importer.plan_nodes
                 else:
-                    failed_keys = {'complete_file_set'}
-                if failed_keys:
-                    if {'study_instance_uid', 'complete_file_set'}.intersection(failed_keys):
+                    nodes = {uid: self.dicom_importer.plan_nodes[uid]}
+                for uid, node in nodes.items():
+                    if uid in list(self.parsed_dicom_data):
+                        validation = self.parsed_dicom_data[uid].validation
+                        failed_keys = {key for key, value in validation.items() if not value['status']}
+                    else:
+                        failed_keys = {'complete_file_set'}
+                    if failed_keys:
+                        if {'study_instance_uid', 'complete_file_set'}.intersection(failed_keys):
+                            color = red
+                        elif {'physician', 'ptv'}.intersection(failed_keys):
+                            color = orange
+                        else:
+                            color = yellow
+                    elif uid in self.dicom_importer.incomplete_plans:
                         color = red
-                    elif {'physician', 'ptv'}.intersection(failed_keys):
-                        color = orange
                     else:
-                        color = yellow
-                elif uid in self.dicom_importer.incomplete_plans:
-                    color = red
-                else:
-                    color = None
-                self.tree_ctrl_import.SetItemBackgroundColour(node, color)
-
-                if uid is not None:
-                    self.tree_ctrl_import.CheckItem(node, color != red)
+                        color = None
+                    self.tree_ctrl_import.SetItemBackgroundColour(node, color)
 
-            del wait
+                    if uid is not None:
+                        self.tree_ctrl_import.CheckItem(node, color != red)
 
     def update_warning_label(self):
         msg = ''
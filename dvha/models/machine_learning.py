@@ -770,7 +770,7 @@ class MachineLearningPlotData:
         self.X = {'data': X, 'train': split_data[0], 'test': split_data[1]}
         self.indices = {'data': indices, 'train': split_data[2], 'test': split_data[3]}
         self.y = {'data': y, 'train': [y[i] for i in split_data[2]], 'test': [y[i] for i in split_data[3]]}
-        self.x = {key: [i + 1 for i in range(len(data))] for key, data in self.y.items()}
+        self.x = {key: np.arange(1, len(data) + 1, dtype=np.int32) for key, data in self.y.items()}
 
         # Train model, then calculate predictions, residuals, and mse
         self.reg.fit(self.X['train'], self.y['train'])
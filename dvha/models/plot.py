@@ -17,18 +17,65 @@ from bokeh.models import Legend, HoverTool, ColumnDataSource, DataTable, TableCo
     NumberFormatter, Div, Range1d, LabelSet, Spacer
 from bokeh.layouts import column, row
 from bokeh.palettes import Colorblind8 as palette
+import csv
 import itertools
 import numpy as np
+from io import StringIO
 from math import pi
-from os.path import join, isdir
-from os import mkdir
-from dvha.tools.utilities import collapse_into_single_dates, moving_avg, is_windows
+from functools import lru_cache
+from os.path import join, isdir, isfile
+from os import mkdir, replace
+from dvha.tools.utilities import collapse_into_single_dates, moving_avg, is_windows, get_line_vertices
 from dvha.tools.stats import MultiVariableRegression, get_control_limits
 from dvha.paths import TEMP_DIR
 
 
 DEFAULT_TOOLS = "pan,box_zoom,crosshair,reset"
 
+# Data sets and figures of PlotMachineLearning, in display order
+ML_DATA_TYPES = ('train', 'test')
+ML_PLOT_KEYS = ('data', 'diff')
+
+# webgl is only used for the DVH plot, which can have thousands of line segments, since the WebView backends may lack
+# webgl support and bokeh's webgl glyphs do not support all hover and selection styling
+# Glyphs without webgl support (e.g., varea) are drawn on the canvas by bokeh automatically
+DVH_OUTPUT_BACKEND = 'webgl'
+
+# Number of window sizes per plot for which rendered html is kept, e.g., to switch between maximized and restored
+HTML_CACHE_SIZE = 4
+
+
+@lru_cache(maxsize=1)
+def get_temp_dir():
+    """
+    Create TEMP_DIR if needed, only checked on first call
+    :return: TEMP_DIR
+    :rtype: str
+    """
+    if not isdir(TEMP_DIR):
+        mkdir(TEMP_DIR)
+    return TEMP_DIR
+
+
+def get_csv_values(values):
+    """
+    :param values: list or numpy array of values
+    :return: values as a list, with numpy arrays converted to python types in one call rather than calling str() on
+    each numpy scalar when written
+    :rtype: list
+    """
+    return values.tolist() if isinstance(values, np.ndarray) else list(values)
+
+
+def join_csv_values(values):
+    """
+    Convert values to a comma-separated string
+    :param values: list or numpy array of values
+    :return: values separated by commas
+    :rtype: str
+    """
+    return ','.join(map(str, get_csv_values(values)))
+
 
 # TODO: have all plot classes load options with a function that runs on update_plot to get latest options
 class Plot:
@@ -37,7 +84,7 @@ class Plot:
     Pass the layout property into a wx sizer
     """
     def __init__(self, parent, options, x_axis_label='X Axis', y_axis_label='Y Axis', x_axis_type='linear',
-                 tools=DEFAULT_TOOLS):
+                 tools=DEFAULT_TOOLS, output_backend='canvas'):
         """
         :param parent: the wx UI object where the plot will be displayed
         :param options: user options object for visual preferences
@@ -48,6 +95,8 @@ class Plot:
         :type y_axis_label: str
         :param x_axis_type: x axis type per bokeh (e.g., 'linear' or 'datetime')
         :type x_axis_type: str
+        :param output_backend: bokeh output backend of the main figure, 'canvas' or 'webgl'
+        :type output_backend: str
         """
 
         self.options = options
@@ -55,12 +104,16 @@ class Plot:
         self.layout = wx.html2.WebView.New(parent)
         self.bokeh_layout = None
         self.html_str = ''
+        self.redraw_size = None  # parent size of the last redraw, None if html_str has changed since
+        self.html_cache = {}  # html_str by parent size, for the current plot data
+        self.written_html_str = None  # html_str last written to file for LoadURL (Windows only)
+        self.plot_data_key = None  # identifies the data of the last update_plot, for plots that skip identical updates
 
         # For windows users, since wx.html2 requires a file to load rather than passing a string
         # The file name for each plot will be join(TEMP_DIR, "%s.html" % self.type)
         self.type = None
 
-        self.figure = figure(x_axis_type=x_axis_type, tools=tools, toolbar_sticky=True)
+        self.figure = figure(x_axis_type=x_axis_type, tools=tools, toolbar_sticky=True, output_backend=output_backend)
         self.figure.xaxis.axis_label = x_axis_label
         self.figure.yaxis.axis_label = y_axis_label
 
@@ -78,13 +131,29 @@ class Plot:
         self.figure.yaxis.axis_label_text_baseline = "bottom"
 
     def clear_plot(self):
-        if self.bokeh_layout:
+        self.plot_data_key = None
+        if self.bokeh_layout and not self.is_clear:
             self.clear_sources()
             self.figure.xaxis.axis_label = ''
             self.figure.yaxis.axis_label = ''
             self.update_bokeh_layout_in_wx_python()
 
+    @property
+    def is_clear(self):
+        """
+        :return: True if all sources are empty and axis labels are blank, i.e., clear_plot would not change the plot
+        :rtype: bool
+        """
+        if any(axis.axis_label for axis in list(self.figure.xaxis) + list(self.figure.yaxis)):
+            return False
+        return all(self.is_source_empty(key) for key in self.source)
+
+    def is_source_empty(self, source_key):
+        return not any(len(values) for values in self.source[source_key].data.values())
+
     def clear_source(self, source_key):
+        if self.is_source_empty(source_key):  # avoid triggering a bokeh change event for no reason
+            return
         data = {data_key: [] for data_key in list(self.source[source_key].data)}
         self.source[source_key].data = data
 
@@ -93,13 +162,24 @@ class Plot:
             self.clear_source(key)
 
     def update_bokeh_layout_in_wx_python(self):
+        self.redraw_size = None
+        self.html_cache.clear()  # plot data has changed
+        self.render_html()
+
+    def render_html(self):
         self.html_str = get_layout_html(self.bokeh_layout)
+        self.show_html()
+
+    def show_html(self):
         if is_windows():  # Windows requires LoadURL()
-            if not isdir(TEMP_DIR):
-                mkdir(TEMP_DIR)
-            web_file = join(TEMP_DIR, "%s.html" % self.type)
-            with open(web_file, 'wb') as f:
-                f.write(self.html_str.encode("utf-8"))
+            web_file = join(get_temp_dir(), "%s.html" % self.type)
+            if self.html_str != self.written_html_str or not isfile(web_file):
+                # write to a temporary file then rename, so the WebView never loads a partially written file
+                temp_file = web_file + '.tmp'
+                with open(temp_file, 'wb') as f:
+                    f.write(self.html_str.encode("utf-8"))
+                replace(temp_file, web_file)
+                self.written_html_str = self.html_str
             self.layout.LoadURL(web_file)
         else:
             self.layout.SetPage(self.html_str, "")
@@ -117,16 +197,16 @@ class Plot:
         :return: data only including studies with no 'None' values
         :rtype: tuple
         """
-        bad_indices = []
+        is_good = np.ones(len(data[0]), dtype=bool)
         for var in data:
-            bad_indices.extend([i for i, value in enumerate(var) if value == 'None'])
-        bad_indices = set(bad_indices)
+            is_good &= np.asarray(var, dtype=object) != 'None'
+        good_indices = np.flatnonzero(is_good).tolist()
 
-        ans = [[value for i, value in enumerate(var) if i not in bad_indices] for var in data]
+        ans = [[var[i] for i in good_indices] for var in data]
 
         for var in [mrn, uid, dates]:
             if var:
-                ans.append([value for i, value in enumerate(var) if i not in bad_indices])
+                ans.append([var[i] for i in good_indices])
 
         return tuple(ans)
 
@@ -134,8 +214,21 @@ class Plot:
         pass
 
     def redraw_plot(self):
+        # html_str is only regenerated if the plot has been updated since it was last rendered at this size
+        size = tuple(self.layout.GetParent().GetSize())
+        if size == self.redraw_size:
+            return
+
         self.set_figure_dimensions()
-        self.update_bokeh_layout_in_wx_python()
+        if size in self.html_cache:
+            self.html_str = self.html_cache[size]
+            self.show_html()
+        else:
+            self.render_html()
+            if len(self.html_cache) >= HTML_CACHE_SIZE:
+                self.html_cache.pop(next(iter(self.html_cache)))
+            self.html_cache[size] = self.html_str
+        self.redraw_size = size
 
 
 class PlotStatDVH(Plot):
@@ -150,7 +243,8 @@ class PlotStatDVH(Plot):
         :param options: user preferences
         :type options: Options
         """
-        Plot.__init__(self, parent, options, x_axis_label='Dose (cGy)', y_axis_label='Relative Volume')
+        Plot.__init__(self, parent, options, x_axis_label='Dose (cGy)', y_axis_label='Relative Volume',
+                      output_backend=DVH_OUTPUT_BACKEND)
 
         self.type = 'dvh'
         self.parent = parent
@@ -164,8 +258,8 @@ class PlotStatDVH(Plot):
                        'stats': ColumnDataSource(data=dict(x=[], min=[], mean=[], median=[], max=[], mrn=[])),
                        'patch': ColumnDataSource(data=dict(x=[], y1=[], y2=[]))}
         self.layout_done = False
-        self.stat_dvhs = {key: np.array(0) for key in ['min', 'q1', 'mean', 'median', 'q3', 'max']}
-        self.x = []
+        self.stat_dvhs = {key: np.empty(0, dtype=np.float32) for key in ['min', 'q1', 'mean', 'median', 'q3', 'max']}
+        self.x = np.empty(0, dtype=int)
 
         self.__add_hover()
         self.__add_plot_data()
@@ -253,21 +347,25 @@ class PlotStatDVH(Plot):
 
         self.set_figure_dimensions()
 
-        self.clear_sources()
+        # every source is fully reassigned below, so clearing first would only add a redundant change event
         self.dvh = dvh
-        self.x = list(range(dvh.bin_count))
-        self.stat_dvhs = dvh.get_standard_stat_dvh()
+        self.x = np.arange(dvh.bin_count)
+        # relative volumes don't need float64 precision on screen, float32 halves the arrays embedded in the html
+        self.stat_dvhs = {key: value.astype(np.float32) for key, value in dvh.get_standard_stat_dvh().items()}
 
         data = {'dvh': dvh.get_cds_data(),
                 'stats': {key: self.stat_dvhs[key] for key in ['max', 'median', 'mean', 'min']},
                 'patch': {'x': self.x, 'y1': self.stat_dvhs['q3'], 'y2': self.stat_dvhs['q1']}}
 
         # Add additional data to dvh data
-        data['dvh']['x'] = dvh.x_data
-        data['dvh']['y'] = dvh.y_data
+        # only the vertices of each curve are plotted, flat runs like the zero-filled tails are drawn from end points
+        is_vertex = get_line_vertices(dvh.dvh).T
+        y_data = dvh.dvh.T.astype(np.float32)
+        data['dvh']['x'] = [self.x[mask] for mask in is_vertex]
+        data['dvh']['y'] = [y[mask] for y, mask in zip(y_data, is_vertex)]
         data['dvh']['mrn'] = dvh.mrn
         data['dvh']['roi_name'] = dvh.roi_name
-        data['dvh']['color'] = [color for j, color in zip(range(dvh.count), itertools.cycle(palette))]
+        data['dvh']['color'] = list(itertools.islice(itertools.cycle(palette), dvh.count))
 
         # Add x-axis to stats dvhs
         data['stats']['x'] = self.x
@@ -292,27 +390,29 @@ class PlotStatDVH(Plot):
         :rtype: str
         """
         data = self.source['dvh'].data
-        summary, dvh_data = [], []
+        csv_buffer = StringIO()
+        writer = csv.writer(csv_buffer, lineterminator='\n')
 
         if include_summary:
-            summary = ['MRN,Study Instance UID,ROI Name,ROI Type,Rx Dose,Volume,Min Dose,Mean Dose,Max Dose']
-            for i, mrn in enumerate(data['mrn']):
-                keys = ['mrn', 'study_instance_uid', 'roi_name', 'roi_type', 'rx_dose',
-                        'volume', 'min_dose', 'mean_dose', 'max_dose']
-                summary.append(','.join([str(data[key][i]).replace(',', '^') for key in keys]))
-            summary.append('')
+            keys = ['mrn', 'study_instance_uid', 'roi_name', 'roi_type', 'rx_dose',
+                    'volume', 'min_dose', 'mean_dose', 'max_dose']
+            writer.writerow(['MRN', 'Study Instance UID', 'ROI Name', 'ROI Type', 'Rx Dose', 'Volume', 'Min Dose',
+                             'Mean Dose', 'Max Dose'])
+            writer.writerows(map(str, row) for row in zip(*[data[key] for key in keys]))
+            writer.writerow([])
 
         if include_dvhs:
-            max_x = max([len(x) for x in data['x']])
-            dvh_data = ['MRN,Study Instance UID,ROI Name,Dose bins (cGy) ->,%s' % ','.join([str(x) for x in range(max_x)])]
-            for i, mrn in enumerate(data['mrn']):
-                clean_mrn = mrn.replace(',', '^')
-                clean_uid = data['study_instance_uid'][i].replace(',', '^')
-                clean_roi = data['roi_name'][i].replace(',', '^')
-                dvh_data.append("%s,%s,%s,,%s" %
-                                (clean_mrn, clean_uid, clean_roi, ','.join(str(y) for y in data['y'][i])))
+            # plotted DVHs are decimated float32, export every bin at full precision from the DVH object instead
+            y_data = self.dvh.y_data if len(data['y']) else []
+            max_x = max(map(len, y_data), default=0)
+            writer.writerow(['MRN', 'Study Instance UID', 'ROI Name', 'Dose bins (cGy) ->'] + list(range(max_x)))
+            writer.writerows([mrn, uid, roi_name, ''] + list(y)
+                             for mrn, uid, roi_name, y in zip(data['mrn'], data['study_instance_uid'],
+                                                               data['roi_name'], y_data))
 
-        return '\n'.join(summary + dvh_data)
+        # rows are joined by new lines, without a trailing new line
+        csv_str = csv_buffer.getvalue()
+        return csv_str[:-1] if csv_str.endswith('\n') else csv_str
 
 
 class PlotTimeSeries(Plot):
@@ -339,6 +439,7 @@ class PlotTimeSeries(Plot):
                        'bound': ColumnDataSource(data=dict(x=[], mrn=[], upper=[], avg=[], lower=[])),
                        'patch': ColumnDataSource(data=dict(x=[], y=[]))}
         self.y_axis_label = ''
+        self.y_array = np.array([], dtype=float)  # y of self.source['plot'], shared by the histogram and trend
 
         self.div = Div(text='<hr>')
 
@@ -408,7 +509,9 @@ class PlotTimeSeries(Plot):
         self.set_figure_dimensions()
 
         self.y_axis_label = y_axis_label
-        self.clear_sources()
+        # plot and hist are always reassigned below, only the trend sources may be left unset
+        for key in ['trend', 'bound', 'patch']:
+            self.clear_source(key)
         self.figure.yaxis.axis_label = y_axis_label
         self.figure.xaxis.axis_label = 'Simulation Date'
         self.histogram.xaxis.axis_label = y_axis_label
@@ -420,33 +523,35 @@ class PlotTimeSeries(Plot):
         self.update_bokeh_layout_in_wx_python()
 
     def update_plot_data(self, x, y, mrn, uid):
-        valid_indices = [i for i, value in enumerate(y) if value != 'None']
-        self.source['plot'].data = {'x': [value for i, value in enumerate(x) if i in valid_indices],
-                                    'y': [value for i, value in enumerate(y) if i in valid_indices],
-                                    'mrn': [value for i, value in enumerate(mrn) if i in valid_indices],
-                                    'uid': [value for i, value in enumerate(uid) if i in valid_indices]}
+        valid_points = [point for point in zip(x, y, mrn, uid) if point[1] != 'None']
+        x, y, mrn, uid = map(list, zip(*valid_points)) if valid_points else ([], [], [], [])
+        self.y_array = np.array(y, dtype=np.float64)
+        self.source['plot'].data = {'x': x, 'y': self.y_array, 'mrn': mrn, 'uid': uid}
+
+    def clear_sources(self):
+        super().clear_sources()
+        self.y_array = np.array([], dtype=float)
 
     def update_histogram(self, bin_size=10):
         width_fraction = 0.9
-        hist, bins = np.histogram(self.source['plot'].data['y'], bins=bin_size)
-        width = [width_fraction * (bins[1] - bins[0])] * bin_size
+        hist, bins = np.histogram(self.y_array, bins=bin_size)
+        width = np.full(bin_size, width_fraction * (bins[1] - bins[0]))
         center = (bins[:-1] + bins[1:]) / 2.
         self.source['hist'].data = {'x': center, 'top': hist, 'width': width}
 
     def update_trend(self, avg_len, percentile):
 
         x = self.source['plot'].data['x']
-        y = self.source['plot'].data['y']
-        if x and y:
+        y = self.y_array
+        if x and len(y):
             x_len = len(x)
 
             data_collapsed = collapse_into_single_dates(x, y)
             x_trend, y_trend = moving_avg(data_collapsed, avg_len)
 
-            y_np = np.array(self.source['plot'].data['y'])
-            upper_bound = float(np.percentile(y_np, 50. + percentile / 2.))
-            average = float(np.percentile(y_np, 50))
-            lower_bound = float(np.percentile(y_np, 50. - percentile / 2.))
+            # one call so that y is only sorted once for all three percentiles
+            percentiles = [50. - percentile / 2., 50., 50. + percentile / 2.]
+            lower_bound, average, upper_bound = np.percentile(self.y_array, percentiles).tolist()
 
             self.source['trend'].data = {'x': x_trend,
                                          'y': y_trend,
@@ -462,10 +567,13 @@ class PlotTimeSeries(Plot):
 
     def get_csv(self):
         data = self.source['plot'].data
-        csv_data = ['MRN,Study Instance UID,Date,%s' % self.y_axis_label]
-        for i in range(len(data['mrn'])):
-            csv_data.append(','.join(str(data[key][i]).replace(',', '^') for key in ['mrn', 'uid', 'x', 'y']))
-        return '\n'.join(csv_data)
+        csv_buffer = StringIO()
+        writer = csv.writer(csv_buffer, lineterminator='\n')
+        writer.writerow(['MRN', 'Study Instance UID', 'Date', self.y_axis_label])
+        writer.writerows(zip(*[map(str, get_csv_values(data[key])) for key in ['mrn', 'uid', 'x', 'y']]))
+
+        # rows are joined by new lines, without a trailing new line
+        return csv_buffer.getvalue()[:-1]
 
     def set_figure_dimensions(self):
         panel_width, panel_height = self.parent.GetSize()
@@ -578,7 +686,23 @@ class PlotRegression(Plot):
                                    self.regression_table,
                                    row(self.figure_residual_fits, self.figure_prob_plot))
 
-    def update_plot(self, plot_data, x_var, x_axis_title, y_axis_title):
+    def update_plot(self, plot_data, x_var, x_axis_title, y_axis_title, data_key=None):
+        """
+        :param plot_data: output of StatsData.get_bokeh_data
+        :type plot_data: dict
+        :param x_var: x-variable name
+        :type x_var: str
+        :param x_axis_title: x-axis title with units
+        :type x_axis_title: str
+        :param y_axis_title: y-axis title with units
+        :type y_axis_title: str
+        :param data_key: optional hashable identifying plot_data (e.g., StatsData.version and the variable names), the
+        update is skipped if it matches the data_key of the previous update
+        """
+        if data_key is not None and data_key == self.plot_data_key:
+            return
+        self.plot_data_key = data_key
+
         self.set_figure_dimensions()
         self.x_axis_title, self.y_axis_title = x_axis_title, y_axis_title
         self.clear_sources()
@@ -605,22 +729,22 @@ class PlotRegression(Plot):
                                           mrn=self.source['plot'].data['mrn'],
                                           dates=self.source['plot'].data['date'])
 
-        data = np.array([y, x])
-        clean_data = data[:, ~np.any(np.isnan(data), axis=0)]
-        X = np.transpose(clean_data[1:])
-        y = clean_data[0]
+        x_values, y_values = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+        is_finite = np.isfinite(x_values) & np.isfinite(y_values)
+        X = x_values[is_finite].reshape(-1, 1)
+        y = y_values[is_finite]
 
         self.reg = MultiVariableRegression(X, y)
 
         x_trend = [min(x), max(x)]
-        y_trend = np.add(np.multiply(x_trend, self.reg.slope), self.reg.y_intercept)
+        y_trend = np.array(x_trend) * self.reg.slope + self.reg.y_intercept
 
         self.source['residuals'].data = {'x': self.reg.predictions,
                                          'y': self.reg.residuals,
                                          'mrn': mrn,
                                          'date': date}
 
-        self.source['residuals_zero'].data = {'x': [min(self.reg.predictions), max(self.reg.predictions)],
+        self.source['residuals_zero'].data = {'x': [np.min(self.reg.predictions), np.max(self.reg.predictions)],
                                               'y': [0, 0],
                                               'mrn': [None, None]}
 
@@ -644,26 +768,26 @@ class PlotRegression(Plot):
 
     def get_csv_data(self):
         plot_data = self.source['plot'].data
-        csv_data = ['Linear Regression',
-                    'Data',
-                    ',MRN,%s' % ','.join(plot_data['mrn']),
-                    ',Study Instance UID,%s' % ','.join(plot_data['uid']),
-                    ',Sim Study Date,%s' % ','.join(plot_data['date']),
-                    'Independent,%s,%s' % (self.y_axis_title, ','.join(str(a) for a in plot_data['y'])),
-                    'Dependent,%s,%s' % (self.x_axis_title, ','.join(str(a) for a in plot_data['x'])),
-                    '',
-                    self.get_csv_model(),
-                    '',
-                    self.get_csv_analysis()]
-
-        return '\n'.join(csv_data)
+        csv_buffer = StringIO()
+        writer = csv.writer(csv_buffer, lineterminator='\n')
+        writer.writerows([['Linear Regression'],
+                          ['Data'],
+                          ['', 'MRN'] + get_csv_values(plot_data['mrn']),
+                          ['', 'Study Instance UID'] + get_csv_values(plot_data['uid']),
+                          ['', 'Sim Study Date'] + get_csv_values(plot_data['date']),
+                          ['Independent', self.y_axis_title] + get_csv_values(plot_data['y']),
+                          ['Dependent', self.x_axis_title] + get_csv_values(plot_data['x']),
+                          []])
+        csv_buffer.write('\n'.join([self.get_csv_model(), '', self.get_csv_analysis()]))
+
+        return csv_buffer.getvalue()
 
     def get_csv_model(self):
         data = self.source['table'].data
+        variables = ['var', 'coef', 'std_err', 't_value', 'p_value']
         csv_model = ['Model',
                      ',Coef,Std. Err.,t-value,p-value']
-        for i in range(len(data['var'])):
-            csv_model.append(self.get_csv_model_row(i))
+        csv_model.extend(','.join(map(str, row)) for row in zip(*[data[var] for var in variables]))
 
         csv_model.extend(["R^2,%s" % self.reg.r_sq,
                           "MSE,%s" % self.reg.mse])
@@ -672,16 +796,11 @@ class PlotRegression(Plot):
 
     def get_csv_analysis(self):
         return '\n'.join(['Analysis',
-                          'Quantiles,%s' % ','.join(str(v) for v in self.reg.norm_prob_plot[0]),
-                          'Ordered Values,%s' % ','.join(str(v) for v in self.reg.norm_prob_plot[1]),
+                          'Quantiles,%s' % join_csv_values(self.reg.norm_prob_plot[0]),
+                          'Ordered Values,%s' % join_csv_values(self.reg.norm_prob_plot[1]),
                           '',
-                          'Residuals,%s' % ','.join(str(v) for v in self.reg.residuals),
-                          'Fitted Values,%s' % ','.join(str(v) for v in self.reg.predictions)])
-
-    def get_csv_model_row(self, index):
-        data = self.source['table'].data
-        variables = ['var', 'coef', 'std_err', 't_value', 'p_value']
-        return ','.join([str(data[var][index]) for var in variables])
+                          'Residuals,%s' % join_csv_values(self.reg.residuals),
+                          'Fitted Values,%s' % join_csv_values(self.reg.predictions)])
 
 
 class PlotMultiVarRegression(Plot):
@@ -804,7 +923,7 @@ class PlotMultiVarRegression(Plot):
                                          'mrn': self.mrn,
                                          'date': self.dates}
 
-        self.source['residuals_zero'].data = {'x': [min(self.reg.predictions), max(self.reg.predictions)],
+        self.source['residuals_zero'].data = {'x': [np.min(self.reg.predictions), np.max(self.reg.predictions)],
                                               'y': [0, 0],
                                               'mrn': [None, None]}
 
@@ -818,7 +937,7 @@ class PlotMultiVarRegression(Plot):
         fit_param[0] = "R²: %0.3f ----- MSE: %0.3f" % (self.reg.r_sq, self.reg.mse)
         fit_param[1] = "f stat: %0.3f ---- p value: %0.3f" % (self.reg.f_stat, self.reg.f_p_value)
         self.source['table'].data = {'var': ['y-int'] + x_variables,
-                                     'coef': [self.reg.y_intercept] + self.reg.slope.tolist(),
+                                     'coef': self.reg.params,
                                      'std_err': self.reg.sd_b,
                                      't_value': self.reg.ts_b,
                                      'p_value': self.reg.p_values,
@@ -831,30 +950,27 @@ class PlotMultiVarRegression(Plot):
         self.update_bokeh_layout_in_wx_python()
 
     def get_csv_data(self):
-        csv_data = ['Multi-Variable Regression',
-                    'Data',
-                    ',MRN,%s' % ','.join(self.mrn),
-                    ',Study Instance UID,%s' % ','.join(self.uid),
-                    ',Sim Study Date,%s' % ','.join(self.dates),
-                    self.get_regression_csv_row(self.y_variable, self.y, var_type='Dependent')]
-
-        for i, x_variable in enumerate(self.x_variables):
-            csv_data.append(self.get_regression_csv_row(x_variable, self.X[:, i]))
-
-        csv_data.append('')
-        csv_data.append(self.get_csv_model())
-
-        csv_data.append('')
-        csv_data.append(self.get_csv_analysis())
-
-        return '\n'.join(csv_data)
+        csv_buffer = StringIO()
+        writer = csv.writer(csv_buffer, lineterminator='\n')
+        writer.writerows([['Multi-Variable Regression'],
+                          ['Data'],
+                          ['', 'MRN'] + get_csv_values(self.mrn),
+                          ['', 'Study Instance UID'] + get_csv_values(self.uid),
+                          ['', 'Sim Study Date'] + get_csv_values(self.dates),
+                          self.get_regression_csv_row(self.y_variable, self.y, var_type='Dependent')])
+        writer.writerows(self.get_regression_csv_row(x_variable, self.X[:, i])
+                         for i, x_variable in enumerate(self.x_variables))
+        writer.writerow([])
+        csv_buffer.write('\n'.join([self.get_csv_model(), '', self.get_csv_analysis()]))
+
+        return csv_buffer.getvalue()
 
     def get_csv_model(self):
         data = self.source['table'].data
+        variables = ['var', 'coef', 'std_err', 't_value', 'p_value']
         csv_model = ['Model',
                      ',Coef,Std. Err.,t-value,p-value']
-        for i in range(len(data['var'])):
-            csv_model.append(self.get_csv_model_row(i))
+        csv_model.extend(','.join(map(str, row)) for row in zip(*[data[var] for var in variables]))
 
         csv_model.extend(["R^2,%s" % self.reg.r_sq,
                           "MSE,%s" % self.reg.mse,
@@ -865,20 +981,15 @@ class PlotMultiVarRegression(Plot):
 
     def get_csv_analysis(self):
         return '\n'.join(['Analysis',
-                          'Quantiles,%s' % ','.join(str(v) for v in self.reg.norm_prob_plot[0]),
-                          'Ordered Values,%s' % ','.join(str(v) for v in self.reg.norm_prob_plot[1]),
+                          'Quantiles,%s' % join_csv_values(self.reg.norm_prob_plot[0]),
+                          'Ordered Values,%s' % join_csv_values(self.reg.norm_prob_plot[1]),
                           '',
-                          'Residuals,%s' % ','.join(str(v) for v in self.reg.residuals),
-                          'Fitted Values,%s' % ','.join(str(v) for v in self.reg.predictions)])
-
-    def get_csv_model_row(self, index):
-        data = self.source['table'].data
-        variables = ['var', 'coef', 'std_err', 't_value', 'p_value']
-        return ','.join([str(data[var][index]) for var in variables])
+                          'Residuals,%s' % join_csv_values(self.reg.residuals),
+                          'Fitted Values,%s' % join_csv_values(self.reg.predictions)])
 
     @staticmethod
     def get_regression_csv_row(var_name, data, var_type='Independent'):
-        return '%s,%s,%s' % (var_type, var_name, ','.join(str(a) for a in data))
+        return [var_type, var_name] + get_csv_values(data)
 
     @property
     def final_stats_data(self):
@@ -1064,24 +1175,26 @@ class PlotControlChart(Plot):
 
         center_line, ucl, lcl = get_control_limits(y)
 
-        colors = [self.options.CONTROL_CHART_OUT_OF_CONTROL_COLOR, self.options.PLOT_COLOR]
-        alphas = [self.options.CONTROL_CHART_OUT_OF_CONTROL_ALPHA, self.options.CONTROL_CHART_CIRCLE_ALPHA]
-        color = [colors[ucl > value > lcl] for value in y]
-        alpha = [alphas[ucl > value > lcl] for value in y]
+        values = np.asarray(y, dtype=float)
+        in_control = (values < ucl) & (values > lcl)
+        color = np.where(in_control, self.options.PLOT_COLOR, self.options.CONTROL_CHART_OUT_OF_CONTROL_COLOR).tolist()
+        alpha = np.where(in_control, self.options.CONTROL_CHART_CIRCLE_ALPHA,
+                         self.options.CONTROL_CHART_OUT_OF_CONTROL_ALPHA).tolist()
 
         self.source['plot'].data = {'x': x, 'y': y, 'mrn': mrn, 'uid': uid,
                                     'color': color, 'alpha': alpha, 'dates': dates}
 
         self.source['patch'].data = {'x': [x[0], x[-1], x[-1], x[0]],
                                      'y': [ucl, ucl, lcl, lcl]}
-        self.source['center_line'].data = {'x': [min(x), max(x)],
+        x_range = [min(x), max(x)]  # shared by the center and control limit lines
+        self.source['center_line'].data = {'x': x_range,
                                            'y': [center_line] * 2,
                                            'mrn': ['center line'] * 2}
 
-        self.source['lcl_line'].data = {'x': [min(x), max(x)],
+        self.source['lcl_line'].data = {'x': x_range,
                                         'y': [lcl] * 2,
                                         'mrn': ['center line'] * 2}
-        self.source['ucl_line'].data = {'x': [min(x), max(x)],
+        self.source['ucl_line'].data = {'x': x_range,
                                         'y': [ucl] * 2,
                                         'mrn': ['center line'] * 2}
 
@@ -1096,24 +1209,26 @@ class PlotControlChart(Plot):
 
         center_line, ucl, lcl = get_control_limits(residuals)
 
-        colors = [self.options.CONTROL_CHART_OUT_OF_CONTROL_COLOR, self.options.PLOT_COLOR]
-        alphas = [self.options.CONTROL_CHART_OUT_OF_CONTROL_ALPHA, self.options.CONTROL_CHART_CIRCLE_ALPHA]
-        color = [colors[ucl > value > lcl] for value in residuals]
-        alpha = [alphas[ucl > value > lcl] for value in residuals]
+        values = np.asarray(residuals, dtype=float)
+        in_control = (values < ucl) & (values > lcl)
+        color = np.where(in_control, self.options.PLOT_COLOR, self.options.CONTROL_CHART_OUT_OF_CONTROL_COLOR).tolist()
+        alpha = np.where(in_control, self.options.CONTROL_CHART_CIRCLE_ALPHA,
+                         self.options.CONTROL_CHART_OUT_OF_CONTROL_ALPHA).tolist()
 
         self.source['adj_plot'].data = {'x': x, 'y': residuals, 'mrn': mrn, 'uid': uid,
                                         'color': color, 'alpha': alpha, 'dates': dates}
 
         self.source['adj_patch'].data = {'x': [x[0], x[-1], x[-1], x[0]],
                                          'y': [ucl, ucl, lcl, lcl]}
-        self.source['adj_center_line'].data = {'x': [min(x), max(x)],
+        x_range = [min(x), max(x)]
+        self.source['adj_center_line'].data = {'x': x_range,
                                                'y': [center_line] * 2,
                                                'mrn': ['center line'] * 2}
 
-        self.source['adj_lcl_line'].data = {'x': [min(x), max(x)],
+        self.source['adj_lcl_line'].data = {'x': x_range,
                                             'y': [lcl] * 2,
                                             'mrn': ['center line'] * 2}
-        self.source['adj_ucl_line'].data = {'x': [min(x), max(x)],
+        self.source['adj_ucl_line'].data = {'x': x_range,
                                             'y': [ucl] * 2,
                                             'mrn': ['center line'] * 2}
 
@@ -1131,18 +1246,14 @@ class PlotControlChart(Plot):
         predictions = regression.reg.predict(X)
         residuals = np.subtract(y, predictions)
 
-        x = [i + 1 for i in range(len(y))]
-
-        sort_index = sorted(range(len(dates)), key=lambda k: dates[k])
-        dates_sorted, residuals_sorted, mrn_sorted, uid_sorted = [], [], [], []
+        x = np.arange(1, len(y) + 1, dtype=np.int32)
 
-        for s in range(len(dates)):
-            dates_sorted.append(dates[sort_index[s]])
-            residuals_sorted.append(residuals[sort_index[s]])
-            mrn_sorted.append(mrn[sort_index[s]])
-            uid_sorted.append(uid[sort_index[s]])
+        # stable, so studies on the same date keep their order
+        order = np.argsort(np.asarray(dates, dtype=object), kind='stable')
+        dates_sorted, mrn_sorted, uid_sorted = [np.asarray(values, dtype=object)[order].tolist()
+                                                for values in (dates, mrn, uid)]
 
-        return {'x': x, 'residuals': residuals_sorted,
+        return {'x': x, 'residuals': residuals[order].tolist(),
                 'mrn': mrn_sorted, 'uid': uid_sorted, 'dates': dates_sorted}
 
     def clear_plot(self):
@@ -1165,17 +1276,19 @@ class PlotControlChart(Plot):
 
         data = self.source['plot'].data
         resid = self.source['adj_plot'].data['y']
-        if resid:
-            residual_column = ',Residual%s' % [' (%s)' % self.model_name, ''][self.model_name is None]
-        else:
-            residual_column = ''
-        csv_data = ['MRN,Study Instance UID,Study #,Date,%s%s' % (self.y_axis_label, residual_column)]
-        for i in range(len(data['mrn'])):
-            csv_data.append(','.join(str(data[key][i]).replace(',', '^') for key in ['mrn', 'uid', 'x', 'dates', 'y']))
-            if resid:
-                csv_data[-1] = csv_data[-1] + ',%s' % resid[i]
+        columns = [[str(value) for value in data[key]] for key in ['mrn', 'uid', 'x', 'dates', 'y']]
+        header = ['MRN', 'Study Instance UID', 'Study #', 'Date', self.y_axis_label]
+        if len(resid):
+            header.append('Residual%s' % [' (%s)' % self.model_name, ''][self.model_name is None])
+            columns.append(resid)
 
-        return '\n'.join(csv_data)
+        csv_buffer = StringIO()
+        writer = csv.writer(csv_buffer, lineterminator='\n')
+        writer.writerow(header)
+        writer.writerows(zip(*columns))
+
+        # rows are joined by new lines, without a trailing new line
+        return csv_buffer.getvalue()[:-1]
 
 
 class PlotMachineLearning(Plot):
@@ -1195,16 +1308,17 @@ class PlotMachineLearning(Plot):
         self.ml_type = ml_type
         self.ml_type_short = ml_type_short
         self.parent = parent
-        self.mrn = mrn
-        self.study_date = study_date
-        self.uid = uid
+        # object arrays so the training and testing subsets can be gathered by index in update_data
+        self.mrn = np.asarray(mrn, dtype=object)
+        self.study_date = np.asarray(study_date, dtype=object)
+        self.uid = np.asarray(uid, dtype=object)
         self.X, self.y = None, None
 
         self.size_factor = {'data': (0.38, 0.425),
                             'diff': (0.38, 0.425)}
 
         self.options = options
-        self.multi_var_pred = multi_var_pred
+        self.multi_var_pred = np.asarray(multi_var_pred, dtype=np.float64)
         self.multi_var_mse = multi_var_mse
 
         self.y_variable = y_variable
@@ -1247,7 +1361,7 @@ class PlotMachineLearning(Plot):
     def __add_plot_data(self):
         self.glyphs = {}
 
-        for data_type in {'train', 'test'}:
+        for data_type in ML_DATA_TYPES:
             srcs = self.source[data_type]
             figs = self.figures[data_type]
             opt = self.options
@@ -1274,7 +1388,7 @@ class PlotMachineLearning(Plot):
                                        self.figures['test']['data'], self.figures['test']['diff']))
 
     def __add_hover(self):
-        for data_type in {'train', 'test'}:
+        for data_type in ML_DATA_TYPES:
             self.figures[data_type]['data'].add_tools(HoverTool(show_arrow=True,
                                                                 tooltips=[('ID', '@mrn'),
                                                                           ('Date', '@study_date{%F}'),
@@ -1292,7 +1406,7 @@ class PlotMachineLearning(Plot):
 
     def __add_legend(self):
         legend = {}
-        for data_type in {'train', 'test'}:
+        for data_type in ML_DATA_TYPES:
             legend[data_type] = {'data': Legend(items=[("Data  ", [self.glyphs[data_type]['data']]),
                                                        ("%s  " % self.ml_type, [self.glyphs[data_type]['predict']]),
                                                        ("Multi-Variable Reg.  ", [self.glyphs[data_type]['multi_var']])],
@@ -1300,25 +1414,27 @@ class PlotMachineLearning(Plot):
                                  'diff': Legend(items=[("%s  " % self.ml_type, [self.glyphs[data_type]['diff_ml']]),
                                                        ("Multi-Variable Reg.  ", [self.glyphs[data_type]['diff_mvr']])],
                                                 orientation='horizontal')}
-            for key in {'data', 'diff'}:
+            for key in ML_PLOT_KEYS:
                 self.figures[data_type][key].add_layout(legend[data_type][key], 'above')
                 self.figures[data_type][key].legend.click_policy = "hide"
 
     def initialize_figures(self):
+        label_font_size = self.options.PLOT_AXIS_LABEL_FONT_SIZE
+        major_label_font_size = self.options.PLOT_AXIS_MAJOR_LABEL_FONT_SIZE
+        min_border = self.options.MIN_BORDER
 
-        for data_type in {'train', 'test'}:
-            for key in {'data', 'diff'}:
+        for data_type in ML_DATA_TYPES:
+            for key in ML_PLOT_KEYS:
                 fig = self.figures[data_type][key]
-                fig.xaxis.axis_label = 'Study'
-                fig.xaxis.axis_label_text_font_size = self.options.PLOT_AXIS_LABEL_FONT_SIZE
-                fig.yaxis.axis_label_text_font_size = self.options.PLOT_AXIS_LABEL_FONT_SIZE
-                fig.xaxis.major_label_text_font_size = self.options.PLOT_AXIS_MAJOR_LABEL_FONT_SIZE
-                fig.yaxis.major_label_text_font_size = self.options.PLOT_AXIS_MAJOR_LABEL_FONT_SIZE
-                fig.min_border = self.options.MIN_BORDER
-                fig.yaxis.axis_label_text_baseline = "bottom"
+                fig.xaxis.update(axis_label='Study',
+                                 axis_label_text_font_size=label_font_size,
+                                 major_label_text_font_size=major_label_font_size)
+                fig.yaxis.update(axis_label_text_font_size=label_font_size,
+                                 major_label_text_font_size=major_label_font_size,
+                                 axis_label_text_baseline="bottom")
+                fig.min_border = min_border
                 if data_type == 'test':
-                    fig.background_fill_color = "black"
-                    fig.background_fill_alpha = 0.05
+                    fig.update(background_fill_color="black", background_fill_alpha=0.05)
 
             self.figures[data_type]['data'].yaxis.axis_label = self.y_variable
             self.figures[data_type]['diff'].yaxis.axis_label = 'Residual'
@@ -1330,8 +1446,8 @@ class PlotMachineLearning(Plot):
 
     def set_figure_dimensions(self):
         panel_width, panel_height = self.parent.frame_size
-        for data_type in {'train', 'test'}:
-            for key in ['data', 'diff']:
+        for data_type in ML_DATA_TYPES:
+            for key in ML_PLOT_KEYS:
                 self.figures[data_type][key].plot_width = int(self.size_factor['data'][0] * float(panel_width))
                 self.figures[data_type][key].plot_height = int(self.size_factor['data'][1] * float(panel_height))
 
@@ -1344,24 +1460,26 @@ class PlotMachineLearning(Plot):
 
         self.X = plot_data.X['data']
 
-        for data_type in {'train', 'test'}:
+        for data_type in ML_DATA_TYPES:
             x = plot_data.x[data_type]
             y = plot_data.y[data_type]
             y_pred = plot_data.predictions[data_type]
-            multi_var_pred = [self.multi_var_pred[i] for i in plot_data.indices[data_type]]
-            mrn = [self.mrn[i] for i in plot_data.indices[data_type]]
-            uid = [self.uid[i] for i in plot_data.indices[data_type]]
-            study_date = [self.study_date[i] for i in plot_data.indices[data_type]]
+            indices = np.asarray(plot_data.indices[data_type], dtype=np.intp)
+            multi_var_pred = self.multi_var_pred[indices]
+            mrn = self.mrn[indices].tolist()
+            uid = self.uid[indices].tolist()
+            study_date = self.study_date[indices].tolist()
 
             srcs = self.source[data_type]
 
             srcs['data'].data = {'x': x, 'y': y, 'mrn': mrn, 'study_date': study_date, 'uid': uid}
             srcs['predict'].data = {'x': x, 'y': y_pred, 'mrn': mrn, 'study_date': study_date}
             srcs['multi_var'].data = {'x': x, 'y': multi_var_pred, 'mrn': mrn, 'study_date': study_date}
+            y_values = np.asarray(y, dtype=np.float64)
             srcs['diff'].data = {'x': x,
-                                 'y_mvr': np.subtract(np.array(y), np.array(multi_var_pred)),
-                                 'y_ml': np.subtract(np.array(y), np.array(y_pred)),
-                                 'y0': [0] * len(x),
+                                 'y_mvr': y_values - multi_var_pred,
+                                 'y_ml': y_values - np.asarray(y_pred, dtype=np.float64),
+                                 'y0': np.zeros(len(x), dtype=np.float32),
                                  'mrn': mrn, 'study_date': study_date}
 
             self.div_mse[data_type].text = "<u>Mean Square Error</u>: %0.2f (%s) --- %0.2f (MVR)" % \
@@ -1374,16 +1492,17 @@ class PlotMachineLearning(Plot):
         col_titles = 'MRN,Study Instance UID,Study #,Date,%s,%s, Multi-Variable Regression' % \
                      (self.y_variable, self.ml_type)
         csv_data = []
-        for data_type in {'train', 'test'}:
+        for data_type in ML_DATA_TYPES:
             data = self.source[data_type]['data'].data
-            csv_data.append('%s Data\n%s' % (['Training', 'Testing'][data_type == 'test'], col_titles))
-            for i in range(len(data['mrn'])):
-                csv_data.append(','.join(str(data[key][i]).replace(',', '^')
-                                         for key in ['mrn', 'uid', 'x', 'study_date', 'y']))
-                csv_data[-1] = "%s,%s,%s" % (csv_data[-1],
-                                             self.source[data_type]['predict'].data['y'][i],
-                                             self.source[data_type]['multi_var'].data['y'][i])
-            csv_data.append('\n')
+            columns = [[str(value) for value in data[key]] for key in ['mrn', 'uid', 'x', 'study_date', 'y']]
+            columns.extend([get_csv_values(self.source[data_type]['predict'].data['y']),
+                            get_csv_values(self.source[data_type]['multi_var'].data['y'])])
+
+            csv_buffer = StringIO()
+            csv_buffer.write('%s Data\n%s\n' % (['Training', 'Testing'][data_type == 'test'], col_titles))
+            csv.writer(csv_buffer, lineterminator='\n').writerows(zip(*columns))
+            csv_buffer.write('\n')
+            csv_data.append(csv_buffer.getvalue())
 
         # Original dataset (in case not all data was used for training and testing
         # data = self.source['data'].data
@@ -1458,14 +1577,16 @@ class PlotFeatureImportance(Plot):
         self.figure.plot_height = int(self.size_factor['plot'][1] * float(panel_height))
 
     def set_data(self):
-        length = len(self.feature_importances)
-        order = [i[0] for i in sorted(enumerate(self.feature_importances), key=lambda x:x[1])]
-        self.source['plot'].data = {'y': [i+0.5 for i in range(length)],
-                                    'right': [self.feature_importances[i] for i in order],
-                                    'height': [0.5] * length,
-                                    'variable': [self.x_variables[i] for i in order]}
-        self.figure.y_range.factors = [self.x_variables[i] for i in order]
-        self.figure.x_range = Range1d(0, max(self.feature_importances) * 1.05)
+        feature_importances = np.asarray(self.feature_importances, dtype=np.float64)
+        length = len(feature_importances)
+        order = np.argsort(feature_importances, kind='stable')
+        variables = np.asarray(self.x_variables, dtype=object)[order].tolist()
+        self.source['plot'].data = {'y': np.arange(length) + 0.5,
+                                    'right': feature_importances[order],
+                                    'height': np.full(length, 0.5),
+                                    'variable': variables}
+        self.figure.y_range.factors = variables
+        self.figure.x_range = Range1d(0, feature_importances.max() * 1.05)
 
 
 class PlotROIMap(Plot):
@@ -1523,10 +1644,10 @@ class PlotROIMap(Plot):
     def update_roi_map_source_data(self, physician, plot_type=None):
         # TODO: allow ability to define initial viewing range
         self.set_figure_dimensions()
-        new_data = self.roi_map.get_all_institutional_roi_visual_coordinates(physician)
-
-        i_roi = new_data['institutional_roi']
-        p_roi = new_data['physician_roi']
+        # The y offsets depend on which physician ROIs are drawn, so determine the ignored ROIs from the map itself
+        # rather than computing the visual coordinates twice
+        p_roi = self.roi_map.get_physician_rois(physician)
+        i_roi = [self.roi_map.get_institutional_roi(physician, roi) for roi in p_roi]
         b_roi = self.roi_map.branched_institutional_rois[physician]
         if plot_type == 'Linked':
             ignored_roi = [p_roi[i] for i in range(len(i_roi)) if i_roi[i] == 'uncategorized']
@@ -1543,7 +1664,8 @@ class PlotROIMap(Plot):
         self.figure.title.text = 'ROI Map for %s' % physician
         if new_data:
             self.source['map'].data = new_data
-            self.figure.y_range.bounds = (min(self.source['map'].data['y']) - 3, max(self.source['map'].data['y']) + 3)
+            y = np.asarray(new_data['y'])
+            self.figure.y_range.bounds = (float(np.min(y)) - 3, float(np.max(y)) + 3)
             self.update_bokeh_layout_in_wx_python()
         else:
             self.clear_source('map')
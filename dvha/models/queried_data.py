@@ -11,7 +11,7 @@ Class for viewing SQL table data of the current query
 #    available at https://github.com/cutright/DVH-Analytics
 
 import wx
-from dvha.models.data_table import DataTable
+from dvha.models.data_table import DataTable, VirtualListCtrl
 from dvha.db.sql_columns import all_columns as sql_column_info
 from dvha.dialogs.export import save_data_to_file
 from dvha.tools.utilities import get_window_size
@@ -37,8 +37,8 @@ class QueriedDataFrame(wx.Frame):
         self.menu = menu
         self.menu_item_id = menu_item_id
 
-        self.list_ctrl = wx.ListCtrl(self, wx.ID_ANY,
-                                     style=wx.BORDER_SUNKEN | wx.LC_HRULES | wx.LC_REPORT | wx.LC_VRULES)
+        self.list_ctrl = VirtualListCtrl(self, wx.ID_ANY,
+                                         style=wx.BORDER_SUNKEN | wx.LC_HRULES | wx.LC_REPORT | wx.LC_VRULES)
 
         # self.data_table = DataTable(self.list_ctrl, data=self.table_data, columns=self.columns)
         self.data_table = DataTable(self.list_ctrl)
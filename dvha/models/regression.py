@@ -13,8 +13,6 @@ Class to view and calculate linear regressions
 import wx
 from pubsub import pub
 from dvha.models.plot import PlotRegression, PlotMultiVarRegression
-from dvha.models.machine_learning import RandomForestFrame, GradientBoostingFrame, DecisionTreeFrame,\
-    SupportVectorRegressionFrame
 from dvha.dialogs.export import save_data_to_file
 from dvha.dialogs.main import SelectRegressionVariablesDialog
 from dvha.paths import ICONS, MODELS_DIR
@@ -180,7 +178,8 @@ class RegressionFrame:
             self.plot.update_plot(self.stats_data.get_bokeh_data(self.x_axis, self.y_axis),
                                   self.combo_box_x_axis.GetValue(),
                                   self.stats_data.get_axis_title(self.x_axis),
-                                  self.stats_data.get_axis_title(self.y_axis))
+                                  self.stats_data.get_axis_title(self.y_axis),
+                                  data_key=(self.stats_data.version, self.x_axis, self.y_axis))
 
         if self.y_axis in list(self.y_variable_nodes) and self.x_axis in list(self.x_variable_nodes[self.y_axis]):
             self.checkbox.SetValue(True)
@@ -441,16 +440,21 @@ class MultiVarResultsFrame(wx.Frame):
         self.Layout()
         self.Center()
 
+    # machine learning frames (and the sklearn models they load) are imported on first use to reduce launch time
     def on_random_forest(self, evt):
+        from dvha.models.machine_learning import RandomForestFrame
         RandomForestFrame(self.plot.final_stats_data)
 
     def on_gradient_boosting(self, evt):
+        from dvha.models.machine_learning import GradientBoostingFrame
         GradientBoostingFrame(self.plot.final_stats_data)
 
     def on_decision_tree(self, evt):
+        from dvha.models.machine_learning import DecisionTreeFrame
         DecisionTreeFrame(self.plot.final_stats_data)
 
     def on_support_vector_regression(self, evt):
+        from dvha.models.machine_learning import SupportVectorRegressionFrame
         SupportVectorRegressionFrame(self.plot.final_stats_data)
 
     def on_export(self, evt):
@@ -22,7 +22,7 @@ class TimeSeriesFrame:
     """
     Object to be passed into notebook panel for the Time Series tab
     """
-    def __init__(self, parent, dvh, data, options):
+    def __init__(self, parent, dvh, data, options, table_data_getter=None):
         """
         :param parent:  notebook panel in main view
         :type parent: Panel
@@ -32,11 +32,14 @@ class TimeSeriesFrame:
         :type data: dict
         :param options: user options containing visual preferences
         :type options: Options
+        :param table_data_getter: returns the data of a table by name, querying tables that are deferred until first use
+        :type table_data_getter: callable
         """
         self.parent = parent
         self.options = options
         self.dvh = dvh
         self.data = data
+        self.table_data_getter = table_data_getter
 
         self.y_axis_options = sql_columns.numerical
 
@@ -132,9 +135,10 @@ class TimeSeriesFrame:
             if table == 'DVHs':
                 y_data = getattr(self.dvh, var_name)
             else:
-                y_data = getattr(self.data[table], var_name)
-                uids = getattr(self.data[table], 'study_instance_uid')
-                mrn_data = getattr(self.data[table], 'mrn')
+                table_data = self.get_table_data(table)
+                y_data = getattr(table_data, var_name)
+                uids = getattr(table_data, 'study_instance_uid')
+                mrn_data = getattr(table_data, 'mrn')
 
         x_data = []
         for uid in uids:
@@ -197,6 +201,17 @@ class TimeSeriesFrame:
         self.data = data
         self.update_plot()
 
+    def get_table_data(self, table):
+        """
+        :param table: 'Plans', 'Rxs', or 'Beams'
+        :type table: str
+        :return: queried table data
+        :rtype: QuerySQL
+        """
+        if self.table_data_getter is not None:
+            return self.table_data_getter(table)
+        return self.data[table]
+
     def clear_data(self):
         self.plot.clear_plot()
         self.combo_box_y_axis.SetLabelText('ROI Max Dose')
@@ -10,10 +10,12 @@ Class used to manage user options
 #    See the file LICENSE included with this distribution, also
 #    available at https://github.com/cutright/DVH-Analytics
 
+import json
 import pickle
 from os.path import isfile
 from os import unlink
 import hashlib
+from copy import deepcopy
 from dvha.paths import OPTIONS_PATH, OPTIONS_CHECKSUM_PATH
 
 
@@ -125,6 +127,10 @@ class DefaultOptions:
                           'FIDUCIAL', 'IMPLANT', 'OPTIMIZATION', 'PRV', 'SUPPORT', 'NONE']
 
 
+# Built once, restore_defaults applies a deep copy so mutable options (e.g., ROI_TYPES) are not shared
+DEFAULT_OPTIONS = {attr: value for attr, value in DefaultOptions().__dict__.items() if not attr.startswith('_')}
+
+
 class Options(DefaultOptions):
     def __init__(self):
         DefaultOptions.__init__(self)
@@ -142,24 +148,42 @@ class Options(DefaultOptions):
     def load(self):
 
         if isfile(OPTIONS_PATH) and self.validate_options_file():
+            is_legacy_file = False
             try:
-                with open(OPTIONS_PATH, 'rb') as infile:
-                    loaded_options = pickle.load(infile)
-            except EOFError:
-                print('ERROR: Options file corrupted. Loading default options.')
-                loaded_options = {}
+                with open(OPTIONS_PATH, 'r', encoding='utf-8') as infile:
+                    loaded_options = json.load(infile)
+            except ValueError:  # not JSON, options file saved by a previous version of DVHA
+                is_legacy_file = True
+                loaded_options = self.load_legacy_options_file()
 
             for key, value in loaded_options.items():
                 if hasattr(self, key):
                     setattr(self, key, value)
 
+            if is_legacy_file and loaded_options:
+                self.save()  # convert to JSON
+
+    @staticmethod
+    def load_legacy_options_file():
+        """
+        Options were stored with pickle by previous versions of DVHA
+        :return: options stored in OPTIONS_PATH
+        :rtype: dict
+        """
+        try:
+            with open(OPTIONS_PATH, 'rb') as infile:
+                return pickle.load(infile)
+        except EOFError:
+            print('ERROR: Options file corrupted. Loading default options.')
+            return {}
+
     def save(self):
 
         out_options = {}
         for attr in self.option_attr:
             out_options[attr] = getattr(self, attr)
-        with open(OPTIONS_PATH, 'wb') as outfile:
-            pickle.dump(out_options, outfile)
+        with open(OPTIONS_PATH, 'w', encoding='utf-8') as outfile:
+            json.dump(out_options, outfile, indent=4)
         self.save_checksum()
 
     def set_option(self, attr, value):
@@ -175,10 +199,25 @@ class Options(DefaultOptions):
     def calculate_checksum():
         if isfile(OPTIONS_PATH):
             with open(OPTIONS_PATH, 'rb') as infile:
-                options_str = str(infile.read())
-            return hashlib.md5(options_str.encode('utf-8')).hexdigest()
+                return hashlib.blake2b(infile.read(), digest_size=16).hexdigest()
         return None
 
+    @staticmethod
+    def calculate_legacy_checksums():
+        """
+        Checksums of the options file as calculated by previous versions of DVHA, so that a valid options file saved
+        with an older version is not treated as corrupted
+        :return: legacy checksums
+        :rtype: list
+        """
+        if isfile(OPTIONS_PATH):
+            with open(OPTIONS_PATH, 'rb') as infile:
+                options_bytes = infile.read()
+            # md5 of the file contents, and md5 of the text repr of the file contents
+            return [hashlib.md5(options_bytes).hexdigest(),
+                    hashlib.md5(str(options_bytes).encode('utf-8')).hexdigest()]
+        return []
+
     @staticmethod
     def load_stored_checksum():
         if isfile(OPTIONS_CHECKSUM_PATH):
@@ -193,6 +232,9 @@ class Options(DefaultOptions):
             stored_checksum = self.load_stored_checksum()
             if current_checksum == stored_checksum:
                 return True
+            if stored_checksum in self.calculate_legacy_checksums():
+                self.save_checksum()  # store the checksum in the current format
+                return True
         except:
             pass
         print('Corrupted options file detected. Loading default options.')
@@ -203,8 +245,4 @@ class Options(DefaultOptions):
             unlink(OPTIONS_PATH)
         if isfile(OPTIONS_CHECKSUM_PATH):
             unlink(OPTIONS_CHECKSUM_PATH)
-        default_options = DefaultOptions()
-
-        for attr in default_options.__dict__:
-            if not attr.startswith('_'):
-                setattr(self, attr, getattr(default_options, attr))
+        self.__dict__.update(deepcopy(DEFAULT_OPTIONS))
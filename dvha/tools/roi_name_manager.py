@@ -15,6 +15,7 @@ import os
 from shutil import copyfile
 from copy import deepcopy
 import difflib
+from functools import wraps
 from dvha.db.sql_to_python import QuerySQL
 from dvha.db.sql_connector import DVH_SQL
 from dvha.paths import PREF_DIR, SCRIPT_DIR
@@ -22,6 +23,19 @@ from dvha.tools.utilities import flatten_list_of_lists, initialize_directories_a
 from dvha.tools.errors import ROIVariationError
 
 
+def cached_lookup(func):
+    """
+    Memoize a DatabaseROIs lookup in the lookup_cache of the instance, so each map has its own cache
+    """
+    @wraps(func)
+    def wrapper(self, *args):
+        key = (func.__name__,) + args
+        if key not in self.lookup_cache:
+            self.lookup_cache[key] = func(self, *args)
+        return self.lookup_cache[key]
+    return wrapper
+
+
 class Physician:
     """
     Represents a physician in the roi map
@@ -64,6 +78,8 @@ class DatabaseROIs:
 
         self.physicians = {}
         self.institutional_rois = []
+        self.lookup_cache = {}
+        self.is_bulk_import = False
 
         # Copy default ROI files to user folder if they do not exist
         if not os.path.isfile(os.path.join(PREF_DIR, 'institutional.roi')):
@@ -77,6 +93,7 @@ class DatabaseROIs:
     def import_from_file(self):
         self.physicians = {}
         self.institutional_rois = []
+        self.clear_cache()
         # Import institutional roi names
         abs_file_path = os.path.join(PREF_DIR, 'institutional.roi')
         if os.path.isfile(abs_file_path):
@@ -98,6 +115,16 @@ class DatabaseROIs:
 
         self.branched_institutional_rois = {}
 
+    ##############################################
+    # Lookup cache
+    ##############################################
+    # get_institutional_roi, get_physician_roi, and is_roi are memoized since they walk the entire map and are
+    # called repeatedly during import and remapping. Any method that edits the map must call clear_cache()
+    def clear_cache(self):
+        # a bulk import clears the cache once when it is finished (see import_physician_roi_map)
+        if not self.is_bulk_import:
+            self.lookup_cache.clear()
+
     ##############################################
     # Import from file functions
     ##############################################
@@ -111,21 +138,26 @@ class DatabaseROIs:
 
     def import_physician_roi_map(self, abs_file_path, physician):
 
-        with open(abs_file_path, 'r') as document:
-            for line in document:
-                if not line:
-                    continue
-                line = str(line).lower().strip().replace(':', ',').split(',')
-                institutional_roi = line[0].strip()
-                physician_roi = line[1].strip()
+        self.is_bulk_import = True
+        try:
+            with open(abs_file_path, 'r') as document:
+                for line in document:
+                    if not line:
+                        continue
+                    line = str(line).lower().strip().replace(':', ',').split(',')
+                    institutional_roi = line[0].strip()
+                    physician_roi = line[1].strip()
 
-                self.add_institutional_roi(institutional_roi)
-                self.add_physician_roi(physician, institutional_roi, physician_roi)
+                    self.add_institutional_roi(institutional_roi)
+                    self.add_physician_roi(physician, institutional_roi, physician_roi)
 
-                for i in range(2, len(line)):
-                    variation = clean_name(line[i])
-                    if variation != physician_roi:
-                        self.add_variation(physician, physician_roi, variation)
+                    for i in range(2, len(line)):
+                        variation = clean_name(line[i])
+                        if variation != physician_roi:
+                            self.add_variation(physician, physician_roi, variation)
+        finally:
+            self.is_bulk_import = False
+            self.clear_cache()
 
     ###################################
     # Physician functions
@@ -134,6 +166,7 @@ class DatabaseROIs:
         physician = clean_name(physician).upper()
         if physician not in self.get_physicians():
             self.physicians[physician] = Physician(physician)
+            self.clear_cache()
 
         if add_institutional_rois:
             for institutional_roi in self.institutional_rois:
@@ -147,10 +180,12 @@ class DatabaseROIs:
             self.physicians[new_physician] = deepcopy(self.physicians[copy_from])
             if not include_variations:
                 self.physicians[new_physician].delete_all_physician_roi_variations()
+            self.clear_cache()
 
     def delete_physician(self, physician):
         physician = clean_name(physician).upper()
         self.physicians.pop(physician, None)
+        self.clear_cache()
 
     def get_physicians(self):
         physicians = list(self.physicians)
@@ -174,6 +209,7 @@ class DatabaseROIs:
         new_physician = clean_name(new_physician).upper()
         physician = clean_name(physician).upper()
         self.physicians[new_physician] = self.physicians.pop(physician)
+        self.clear_cache()
 
     def rebuild_default_physician(self):
         self.delete_physician('DEFAULT')
@@ -185,6 +221,7 @@ class DatabaseROIs:
     def get_institutional_rois(self):
         return self.institutional_rois
 
+    @cached_lookup
     def get_institutional_roi(self, physician, physician_roi):
         physician = clean_name(physician).upper()
         physician_roi = clean_name(physician_roi)
@@ -198,6 +235,7 @@ class DatabaseROIs:
         if roi not in self.institutional_rois:
             self.institutional_rois.append(roi)
             self.institutional_rois.sort()
+            self.clear_cache()
 
     def rename_institutional_roi(self, new_institutional_roi, institutional_roi):
         new_institutional_roi = clean_name(new_institutional_roi)
@@ -211,10 +249,12 @@ class DatabaseROIs:
                     physician_roi_obj = self.physicians[physician].physician_rois[physician_roi]
                     if physician_roi_obj['institutional_roi'] == institutional_roi:
                         physician_roi_obj['institutional_roi'] = new_institutional_roi
+        self.clear_cache()
         self.rebuild_default_physician()
 
     def set_linked_institutional_roi(self, new_institutional_roi, physician, physician_roi):
         self.physicians[physician].physician_rois[physician_roi]['institutional_roi'] = new_institutional_roi
+        self.clear_cache()
 
     def delete_institutional_roi(self, roi):
         self.rename_institutional_roi('uncategorized', roi)
@@ -256,6 +296,7 @@ class DatabaseROIs:
 
         return []
 
+    @cached_lookup
     def get_physician_roi(self, physician, roi):
         physician = clean_name(physician).upper()
         roi = clean_name(roi)
@@ -282,6 +323,7 @@ class DatabaseROIs:
         if physician_roi not in self.get_physician_rois(physician):
             if institutional_roi in self.institutional_rois:
                 self.physicians[physician].add_physician_roi(institutional_roi, physician_roi)
+                self.clear_cache()
 
     def rename_physician_roi(self, new_physician_roi, physician, physician_roi):
         new_physician_roi = clean_name(new_physician_roi)
@@ -290,6 +332,7 @@ class DatabaseROIs:
         if new_physician_roi != physician_roi:
             self.physicians[physician].physician_rois[new_physician_roi] = \
                 self.physicians[physician].physician_rois.pop(physician_roi, None)
+            self.clear_cache()
         self.add_variation(physician, new_physician_roi, new_physician_roi)
         # self.delete_variation(physician, new_physician_roi, physician_roi)
 
@@ -298,6 +341,7 @@ class DatabaseROIs:
         physician_roi = clean_name(physician_roi)
         if physician_roi in self.get_physician_rois(physician):
             self.physicians[physician].physician_rois.pop(physician_roi, None)
+            self.clear_cache()
 
     def is_physician_roi(self, roi, physician):
         roi = clean_name(roi)
@@ -368,6 +412,10 @@ class DatabaseROIs:
         current_physician_roi = self.get_physician_roi(physician, variation)
         if force or current_physician_roi == 'uncategorized':
             self.physicians[physician].add_physician_roi_variation(physician_roi, variation)
+            self.clear_cache()
+            if self.is_bulk_import:
+                # the cache is kept during a bulk import, so replace the lookup made above
+                self.lookup_cache[('get_physician_roi', physician, variation)] = physician_roi
         else:
             raise ROIVariationError("'%s' is already a variation of %s for %s" %
                                     (variation, current_physician_roi, physician))
@@ -380,6 +428,7 @@ class DatabaseROIs:
             index = self.physicians[physician].physician_rois[physician_roi]['variations'].index(variation)
             self.physicians[physician].physician_rois[physician_roi]['variations'].pop(index)
             self.physicians[physician].physician_rois[physician_roi]['variations'].sort()
+            self.clear_cache()
 
     def delete_variations(self, physician, physician_roi, variations):
         for variation in variations:
@@ -396,6 +445,7 @@ class DatabaseROIs:
             self.add_variation(physician, physician_roi, new_variation)
             self.delete_variation(physician, physician_roi, variation)
 
+    @cached_lookup
     def is_roi(self, roi):
         roi = clean_name(roi)
         for physician in self.get_physicians():
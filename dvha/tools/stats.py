@@ -13,13 +13,19 @@ in Regression and Control Chart tabs
 #    available at https://github.com/cutright/DVH-Analytics
 
 import numpy as np
+from functools import lru_cache
+from itertools import count
 from scipy import stats
+from scipy.special import stdtr
 from sklearn import linear_model
 from sklearn.metrics import mean_squared_error, r2_score
 from regressors import stats as regressors_stats
 from dvha.db import sql_columns
 
 
+# StatsData.version is drawn from here, so versions are unique across StatsData objects
+STATS_DATA_VERSIONS = count()
+
 class StatsData:
     def __init__(self, dvhs, table_data):
         """
@@ -95,6 +101,7 @@ class StatsData:
                             self.data[corr_key] = {'units': self.column_info[var]['units'],
                                                    'values': temp[stat]}
         self.validate_data()
+        self.version = next(STATS_DATA_VERSIONS)
 
     def validate_data(self):
         """
@@ -137,6 +144,7 @@ class StatsData:
                 self.data['NTCP or TCP'] = {'units': '',
                                             'values': self.dvhs.ntcp_or_tcp}
             self.validate_data()
+            self.version = next(STATS_DATA_VERSIONS)
 
     @staticmethod
     def get_src_values(src, var_name, uid):
@@ -271,13 +279,38 @@ def get_p_values(X, y, predictions, params):
     """
 
     newX = np.append(np.ones((len(X), 1)), X, axis=1)
-    MSE = (sum((y - predictions) ** 2)) / (len(newX) - len(newX[0]))
+    MSE = np.sum((y - predictions) ** 2) / (newX.shape[0] - newX.shape[1])
 
-    var_b = MSE * (np.linalg.inv(np.dot(newX.T, newX)).diagonal())
+    # With newX = QR, the diagonal of inv(newX.T newX) is the row-wise sum of squares of inv(R), which avoids
+    # forming and inverting the (potentially ill-conditioned) normal matrix
+    r_inv = np.linalg.inv(np.linalg.qr(newX, mode='r'))
+    var_b = MSE * np.sum(r_inv ** 2, axis=1)
     sd_b = np.sqrt(var_b)
     ts_b = params / sd_b
 
-    return [2 * (1 - stats.t.cdf(np.abs(i), (len(newX) - 1))) for i in ts_b], sd_b, ts_b
+    # two-sided p-value from the t-distribution ufunc, which also avoids the 1 - cdf cancellation for small p-values
+    return (2 * stdtr(newX.shape[0] - 1, -np.abs(ts_b))).tolist(), sd_b, ts_b
+
+
+@lru_cache(maxsize=32)
+def get_normal_order_statistic_medians(n):
+    """
+    Theoretical quantiles of a normal probability plot, as calculated by scipy.stats.probplot, which only depend on
+    the number of points and are shared by repeated regressions of the same cohort
+    :param n: number of points
+    :type n: int
+    :return: normal order statistic medians (read-only)
+    :rtype: np.array
+    """
+    # Filliben's estimate of the uniform order statistic medians
+    medians = np.empty(n, dtype=np.float64)
+    medians[-1] = 0.5 ** (1. / n)
+    medians[0] = 1. - medians[-1]
+    medians[1:-1] = (np.arange(2, n) - 0.3175) / (n + 0.365)
+
+    quantiles = stats.norm.ppf(medians)
+    quantiles.setflags(write=False)
+    return quantiles
 
 
 class MultiVariableRegression:
@@ -297,24 +330,24 @@ class MultiVariableRegression:
 
         self.y_intercept = self.reg.intercept_
         self.slope = self.reg.coef_
-        params = np.append(self.y_intercept, self.slope)
+        self.params = np.append(self.y_intercept, self.slope)
         self.predictions = self.reg.predict(X)
 
         self.r_sq = r2_score(y,  self.predictions)
         self.mse = mean_squared_error(y,  self.predictions)
 
-        self.p_values, self.sd_b, self.ts_b = get_p_values(X, y,  self.predictions, params)
+        self.p_values, self.sd_b, self.ts_b = get_p_values(X, y,  self.predictions, self.params)
 
         self.residuals = np.subtract(y, self.predictions)
 
-        self.norm_prob_plot = stats.probplot(self.residuals, dist='norm', fit=False, plot=None, rvalue=False)
+        self.norm_prob_plot = (get_normal_order_statistic_medians(len(self.residuals)), np.sort(self.residuals))
 
         reg_prob = linear_model.LinearRegression()
         reg_prob.fit([[val] for val in self.norm_prob_plot[0]], self.norm_prob_plot[1])
 
         self.y_intercept_prob = reg_prob.intercept_
         self.slope_prob = reg_prob.coef_
-        self.x_trend_prob = [min(self.norm_prob_plot[0]), max(self.norm_prob_plot[0])]
+        self.x_trend_prob = [self.norm_prob_plot[0][0], self.norm_prob_plot[0][-1]]  # quantiles are in ascending order
         self.y_trend_prob = np.add(np.multiply(self.x_trend_prob, self.slope_prob), self.y_intercept_prob)
 
         self.f_stat = regressors_stats.f_stat(ols, X, y)
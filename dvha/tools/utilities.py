@@ -21,11 +21,17 @@ import os
 import shutil
 import pydicom as dicom
 import pickle
+import gzip
 from dvha.db.sql_connector import DVH_SQL
 from dvha.paths import IMPORT_SETTINGS_PATH, SQL_CNF_PATH, INBOX_DIR, IMPORTED_DIR, REVIEW_DIR,\
     APPS_DIR, APP_DIR, PREF_DIR, DATA_DIR, BACKUP_DIR, TEMP_DIR, MODELS_DIR
 
 
+# Used by save_object_to_file and load_object_from_file, a low level is much faster with nearly the same file size
+GZIP_COMPRESS_LEVEL = 3
+GZIP_MAGIC_NUMBER = b'\x1f\x8b'
+
+
 def is_windows():
     return wx.Platform == '__WXMSW__'
 
@@ -180,52 +186,37 @@ def get_file_paths(start_path, search_subfolders=False, extension=None):
     return []
 
 
-def get_study_instance_uids(**kwargs):
+def get_common_study_instance_uids(**kwargs):
     """
-    Get lists of study instance uids in the SQL database that meet provided conditions
-    The values return in the 'common' key are used for the DVH class in models.dvh.py
-    :param kwargs: keys are SQL table names and the values are conditions in SQL syntax
-    :return: study instance uids for each table, uids found in all tables, and a list of unique uids
-    :rtype: dict
+    Get the study instance uids found in every provided SQL table while meeting each table's condition, using a
+    single query that joins the uids of each table rather than one query per table
+    :param kwargs: keys are SQL table names and the values are conditions in SQL syntax, or a tuple of
+    (condition, params) if the condition contains %s placeholders
+    :return: study instance uids common to all tables, sorted
+    :rtype: list
     """
-    with DVH_SQL() as cnx:
-        uids = {table: cnx.get_unique_values(table, 'study_instance_uid', condition)
-                for table, condition in kwargs.items()}
+    if not kwargs:
+        return []
 
-    complete_list = flatten_list_of_lists(list(uids.values()), remove_duplicates=True)
+    sub_queries, params, aliases = [], [], []
+    for table, condition in kwargs.items():
+        condition, table_params = condition if isinstance(condition, tuple) else (condition, None)
+        alias = "%s_uids" % table.lower()
+        sub_query = "SELECT DISTINCT study_instance_uid FROM %s" % table
+        if condition:
+            sub_query = "%s WHERE %s" % (sub_query, condition)
+            params.extend(table_params or [])
+        sub_queries.append("%s AS (%s)" % (alias, sub_query))
+        aliases.append(alias)
 
-    uids['common'] = [uid for uid in complete_list if is_uid_in_all_keys(uid, uids)]
-    uids['unique'] = complete_list
-
-    return uids
-
-
-def is_uid_in_all_keys(uid, uids):
-    """
-    Check if uid is found in each of the uid lists for each SQL table
-    :param uid: study instance uid
-    :type uid: str
-    :param uids: lists of study instance uids organized by SQL table
-    :type uids: dict
-    :return: True only if uid is found in each of the tables
-    :rtype: bool
-    """
+    joins = ''.join([" JOIN %s USING (study_instance_uid)" % alias for alias in aliases[1:]])
+    query = "WITH %s SELECT study_instance_uid FROM %s%s ORDER BY study_instance_uid;" % \
+            (', '.join(sub_queries), aliases[0], joins)
 
-    table_answer = {}
-    # Initialize a False value for each key
-    for table in list(uids):
-        table_answer[table] = False
-    # search for uid in each keyword fof uid_kwlist
-    for table, value in uids.items():
-        if uid in value:
-            table_answer[table] = True
+    with DVH_SQL() as cnx:
+        results = cnx.query_generic(query, params or None)
 
-    final_answer = True
-    # Product of all answer[key] values (except 'unique')
-    for table, value in table_answer.items():
-        if table not in 'unique':
-            final_answer *= value
-    return final_answer
+    return [str(row[0]) for row in results]
 
 
 def flatten_list_of_lists(some_list, remove_duplicates=False, sort=False):
@@ -247,30 +238,78 @@ def flatten_list_of_lists(some_list, remove_duplicates=False, sort=False):
     return data
 
 
+def get_shallow_table_copy(data):
+    """
+    Copy a table of column data (e.g., DataTable.data) without recursively copying each value, sufficient since
+    the values are immutable strings and numbers
+    :param data: a dictionary with keys being column names and values being lists or numpy arrays
+    :type data: dict
+    :return: a new dictionary with new lists/arrays for each column
+    :rtype: dict
+    """
+    if data is None:
+        return None
+    return {key: column.copy() if hasattr(column, 'copy') else list(column) for key, column in data.items()}
+
+
+def get_indices_by_value(values):
+    """
+    Group the indices of a list by value in a single pass
+    :param values: any list of hashable values
+    :type values: list
+    :return: indices of each unique value, in order of first appearance
+    :rtype: dict
+    """
+    indices = {}
+    for i, value in enumerate(values):
+        indices.setdefault(value, []).append(i)
+    return indices
+
+
+def get_merged_ranges(ranges, key=float):
+    """
+    Merge overlapping (min, max) ranges so that their union is described by disjoint ranges
+    :param ranges: (min, max) tuples, values are returned as provided
+    :type ranges: list
+    :param key: function used to compare values, ranges are returned unmerged if any value is not compatible with key
+    :return: disjoint ranges sorted by min, empty ranges (min > max) are dropped
+    :rtype: list
+    """
+    try:
+        keyed_ranges = sorted((key(lo), key(hi), lo, hi) for lo, hi in ranges)
+    except (TypeError, ValueError):
+        return list(dict.fromkeys(ranges))
+
+    merged = []
+    for key_lo, key_hi, lo, hi in keyed_ranges:
+        if key_lo > key_hi:
+            continue
+        if merged and key_lo <= merged[-1][1]:
+            if key_hi > merged[-1][1]:
+                merged[-1][1], merged[-1][3] = key_hi, hi
+        else:
+            merged.append([key_lo, key_hi, lo, hi])
+
+    return [(lo, hi) for key_lo, key_hi, lo, hi in merged]
+
+
 def collapse_into_single_dates(x, y):
     """
     Function used for a time plot to convert multiple values into one value, while retaining enough information
     to perform a moving average over time
     :param x: a list of dates in ascending order
-    :param y: a list of values and can use the '+' operator as a function of date
+    :param y: a list of numeric values as a function of date
     :return: a unique list of dates, sum of y for that date, and number of original points for that date
     :rtype: dict
     """
 
-    # average daily data and keep track of points per day
-    x_collapsed = [x[0]]
-    y_collapsed = [y[0]]
-    w_collapsed = [1]
-    for n in range(1, len(x)):
-        if x[n] == x_collapsed[-1]:
-            y_collapsed[-1] = (y_collapsed[-1] + y[n])
-            w_collapsed[-1] += 1
-        else:
-            x_collapsed.append(x[n])
-            y_collapsed.append(y[n])
-            w_collapsed.append(1)
+    # x is sorted, so each date starts where it differs from the previous point, then sum y within each date
+    dates = np.array(x, dtype='datetime64[us]')
+    starts = np.flatnonzero(np.concatenate(([True], dates[1:] != dates[:-1])))
+    y_collapsed = np.add.reduceat(np.asarray(y, dtype=np.float64), starts)
+    w_collapsed = np.diff(np.append(starts, len(dates)))
 
-    return {'x': x_collapsed, 'y': y_collapsed, 'w': w_collapsed}
+    return {'x': [x[i] for i in starts], 'y': y_collapsed.tolist(), 'w': w_collapsed.tolist()}
 
 
 def moving_avg(xyw, avg_len):
@@ -283,16 +322,28 @@ def moving_avg(xyw, avg_len):
     :return: list of x values, list of y values
     :rtype: tuple
     """
-    cumsum, moving_aves, x_final = [0], [], []
+    cumsum = np.concatenate(([0.], np.cumsum(np.divide(xyw['y'], xyw['w']))))
+    moving_aves = (cumsum[avg_len:] - cumsum[:-avg_len]) / avg_len
+    x_final = xyw['x'][avg_len - 1:]
+
+    return x_final, moving_aves.tolist()
 
-    for i, y in enumerate(xyw['y'], 1):
-        cumsum.append(cumsum[i - 1] + y / xyw['w'][i - 1])
-        if i >= avg_len:
-            moving_ave = (cumsum[i] - cumsum[i - avg_len]) / avg_len
-            moving_aves.append(moving_ave)
-    x_final = [xyw['x'][i] for i in range(avg_len - 1, len(xyw['x']))]
 
-    return x_final, moving_aves
+def get_line_vertices(curves, tolerance=1e-9):
+    """
+    Find the points needed to draw uniformly spaced curves with straight segments, i.e., interior points of
+    straight runs (such as the zero-filled tail of a DVH) are excluded without changing the drawn line
+    :param curves: y-values of each curve (curves[bin, curve_index]), as with DVH.dvh
+    :type curves: numpy 2D array
+    :param tolerance: a point is a vertex if the slope changes by more than this value at that point
+    :type tolerance: float
+    :return: boolean mask of the same shape as curves, True where the point is needed
+    :rtype: numpy 2D array
+    """
+    is_vertex = np.ones(curves.shape, dtype=bool)
+    if curves.shape[0] > 2:
+        is_vertex[1:-1] = np.abs(np.diff(curves, 2, axis=0)) > tolerance
+    return is_vertex
 
 
 def convert_value_to_str(value, rounding_digits=2):
@@ -627,18 +678,21 @@ class MessageDialog:
 
 def save_object_to_file(obj, abs_file_path):
     """
-    Save a python object acceptable for pickle to the provided file path
+    Save a python object acceptable for pickle to the provided file path, compressed with gzip
     """
-    with open(abs_file_path, 'wb') as outfile:
-        pickle.dump(obj, outfile)
+    with gzip.open(abs_file_path, 'wb', compresslevel=GZIP_COMPRESS_LEVEL) as outfile:
+        pickle.dump(obj, outfile, protocol=pickle.HIGHEST_PROTOCOL)
 
 
 def load_object_from_file(abs_file_path):
     """
-    Load a pickled object from the provided absolute file path
+    Load a pickled object from the provided absolute file path, files saved without compression are supported
     """
     if os.path.isfile(abs_file_path):
         with open(abs_file_path, 'rb') as infile:
+            is_compressed = infile.read(2) == GZIP_MAGIC_NUMBER
+        open_func = gzip.open if is_compressed else open
+        with open_func(abs_file_path, 'rb') as infile:
             obj = pickle.load(infile)
         return obj
 